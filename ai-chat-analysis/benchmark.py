@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+In-process benchmarks for the analysis pipeline. Runs the endpoint functions
+and their main stages directly (no HTTP server) on deterministic corpora from
+generate_chat_csv.py and reports throughput, p50/p95/p99 latency and peak RSS.
+
+Usage:
+  python benchmark.py                                  # 100, 1k, 10k and 100k messages
+  python benchmark.py --sizes 100,1000 --repeat 5
+  python benchmark.py --only weekly_report,sentiment   # a subset of cases
+  python benchmark.py --compare old_results.json       # show the change against an earlier run
+
+Each case runs in a fresh process by default, so its peak RSS isn't inflated
+by earlier cases (--in-process runs everything in this process instead).
+The per-message analysis cache and the response cache are cleared before
+every run, so the numbers are for cold inputs; pass --warm to measure
+repeated (cached) inputs. --trace-memory also records the peak memory
+allocated by each run with tracemalloc (which slows the runs down, so
+latencies from such a run aren't comparable).
+Results are written as JSON (--out) so runs can be compared across releases.
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+try:
+    import resource  # Unix only; peak RSS is reported as null elsewhere
+except ImportError:
+    resource = None
+
+import generate_chat_csv
+import main
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+# Fixed start of the generated 90-day window, so every corpus is identical
+CORPUS_START = datetime(2025, 1, 1)
+
+# Settings that change what is being measured, recorded with the results
+RECORDED_SETTINGS = [
+    'NLP_BATCH_SIZE', 'NLP_N_PROCESS', 'SENTIMENT_AGGREGATION', 'ANALYSIS_CACHE_SIZE',
+    'ANALYSIS_WORKERS', 'ANALYSIS_EXECUTOR', 'SHARD_THRESHOLD', 'FAST_RESPONSES', 'GZIP_MIN_SIZE',
+    'GZIP_LEVEL'
+]
+
+
+class Corpus:
+    """
+    A generated corpus of `size` messages, in the shapes the cases need.
+    """
+
+    def __init__(self, size, seed):
+        rows = list(generate_chat_csv.iter_rows(size, seed=seed, start_time=CORPUS_START))[:size]
+        self.size = size
+        self.rows = rows
+        self.messages = [
+            main.ChatMessage(username=row[4], text=row[7], timestamp=row[8])
+            for row in rows
+        ]
+        self.texts = [msg.text for msg in self.messages]
+        self.input = main.AnalysisInput(messages=self.messages)
+        self._csv_path = None
+
+    @property
+    def csv_path(self):
+        # Written on first use, for the training case
+        if self._csv_path is None:
+            handle, self._csv_path = tempfile.mkstemp(suffix='.csv')
+            with os.fdopen(handle, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(generate_chat_csv.HEADER)
+                writer.writerows(self.rows)
+        return self._csv_path
+
+    def cleanup(self):
+        if self._csv_path is not None:
+            os.remove(self._csv_path)
+            # Binary corpus converted from the CSV by training
+            corpus_path = os.path.splitext(self._csv_path)[0] + '.corpus'
+            if os.path.exists(corpus_path):
+                os.remove(corpus_path)
+
+
+def train_case(corpus):
+    # Train on the corpus, then put the serving model back for later cases
+    previous = main.current_model()
+    main.train_on_synthetic_data(corpus.csv_path)
+    main.install_model(previous)
+
+
+def aggregate_case(corpus):
+    # Counters, contributions and report text from already analyzed messages
+    model = main.current_model()
+    batch = main.MessageBatch.from_messages(corpus.messages, with_timestamps=False)
+    entries = main.analyze_texts(corpus.texts, with_topics=True, model=model)
+    started = time.perf_counter()
+    acc = main.WeeklyAccumulator()
+    acc.add_batch(batch, entries)
+    main.build_weekly_report(acc, model, acc.sentiment_score(), "benchmark")
+    return time.perf_counter() - started
+
+
+def ranking_stats(corpus):
+    # Participation entries with one user per ten messages, the shape of an
+    # organisation-wide ranking (the generated corpus only has 20 users)
+    users = max(1, corpus.size // 10)
+    counts = {}
+    for index, text in enumerate(corpus.texts):
+        stats = counts.setdefault(f"user{index % users}", [0, 0])
+        stats[0] += 1
+        stats[1] += len(text.split())
+    return [
+        main.participation_stats(username, messages, words, ((index * 7919) % 2001 - 1000) / 1000)
+        for index, (username, (messages, words)) in enumerate(counts.items())
+    ]
+
+
+def ranking_case(corpus):
+    stats = ranking_stats(corpus)
+    started = time.perf_counter()
+    main.build_user_ranking(stats, corpus.size)
+    return time.perf_counter() - started
+
+
+_loop = None
+
+
+def encode_default_case(corpus):
+    # What FastAPI does with a returned model: dump, validate against
+    # response_model, serialize, then json.dumps in JSONResponse
+    global _loop
+    _loop = _loop or asyncio.new_event_loop()
+    field = next(route.response_field for route in main.app.routes if getattr(route, 'path', None) == '/analyze_users')
+    report = main.build_user_ranking(ranking_stats(corpus), corpus.size)
+    started = time.perf_counter()
+    content = _loop.run_until_complete(serialize_response(field=field, response_content=report, is_coroutine=True))
+    JSONResponse(content).body
+    return time.perf_counter() - started
+
+
+def fast_body(report):
+    previous, main.FAST_RESPONSES = main.FAST_RESPONSES, True
+    try:
+        return main.fast_response(report).body
+    finally:
+        main.FAST_RESPONSES = previous
+
+
+def encode_fast_case(corpus):
+    report = main.build_user_ranking(ranking_stats(corpus), corpus.size)
+    started = time.perf_counter()
+    fast_body(report)
+    return time.perf_counter() - started
+
+
+def encode_gzip_case(corpus):
+    # FAST_RESPONSES plus gzip at GZIP_LEVEL
+    report = main.build_user_ranking(ranking_stats(corpus), corpus.size)
+    started = time.perf_counter()
+    gzip.compress(fast_body(report), main.GZIP_LEVEL)
+    return time.perf_counter() - started
+
+
+# Endpoint functions, called as the API would call them
+ENDPOINTS = {
+    'analyze': lambda corpus: main.analyze_chat(corpus.input),
+    'analyze_users': lambda corpus: main.analyze_user_participation(corpus.input),
+    'weekly_report': lambda corpus: main.generate_weekly_mentor_report(corpus.input),
+    'analyze_user_contributions': lambda corpus: main.analyze_user_contributions(corpus.messages),
+    'train_on_synthetic_data': train_case
+}
+
+# Stages inside those functions, measured on their own
+STAGES = {
+    'classification': lambda corpus: [
+        main.enhanced_message_classification(text) for text in corpus.texts
+    ],
+    'sentiment': lambda corpus: [
+        main.get_sia().polarity_scores(text) for text in corpus.texts
+    ],
+    'parse_keywords': lambda corpus: [
+        len(doc) for doc in main.parse_texts(corpus.texts, 'keywords')
+    ],
+    'parse_topics': lambda corpus: [
+        list(doc.noun_chunks) for doc in main.parse_texts(corpus.texts, 'topics')
+    ],
+    'aggregation': aggregate_case,
+    # Columnar batch and text list, built the way a weekly shard builds them
+    'message_batch': lambda corpus: main.MessageBatch.from_messages(corpus.messages).texts(),
+    'user_ranking': ranking_case,
+    'encode_default': encode_default_case,
+    'encode_fast': encode_fast_case,
+    'encode_gzip': encode_gzip_case
+}
+
+CASES = dict(
+    [(('endpoint', name), func) for name, func in ENDPOINTS.items()] +
+    [(('stage', name), func) for name, func in STAGES.items()]
+)
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == 'darwin' else peak * 1024 / 1e6
+
+
+def summarize(kind, name, size, latencies, rss_before, peak_rss, traced_peaks=None):
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'kind': kind,
+        'name': name,
+        'size': size,
+        'runs': len(latencies),
+        'latency_ms': {
+            'p50': round(float(p50), 3),
+            'p95': round(float(p95), 3),
+            'p99': round(float(p99), 3),
+            'mean': round(float(latencies_ms.mean()), 3),
+            'min': round(float(latencies_ms.min()), 3),
+            'max': round(float(latencies_ms.max()), 3)
+        },
+        'throughput_msgs_per_sec': round(size / (p50 / 1000), 1) if p50 > 0 else None,
+        'rss_before_mb': round(rss_before, 1) if rss_before is not None else None,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        # Peak bytes allocated during a run (--trace-memory), on top of the corpus
+        'traced_peak_mb': round(max(traced_peaks) / 1e6, 3) if traced_peaks else None
+    }
+
+
+def prepare_models():
+    """
+    Load the trained model and the NLP models before anything is timed.
+    """
+    main.load_or_train_model()
+    main.get_sia()
+    main.get_nlp()
+
+
+def run_case(kind, name, size, repeat, seed, warm, trace_memory=False):
+    corpus = Corpus(size, seed)
+    func = CASES[(kind, name)]
+    rss_before = current_rss_mb()
+    latencies = []
+    traced_peaks = []
+    try:
+        for _ in range(repeat):
+            if not warm:
+                main.ANALYSIS_CACHE.clear()
+                main.RESPONSE_CACHE.clear()
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            measured = func(corpus)
+            elapsed = time.perf_counter() - started
+            if trace_memory:
+                traced_peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            # Cases that need setup time their own measured section
+            latencies.append(measured if isinstance(measured, float) else elapsed)
+    finally:
+        corpus.cleanup()
+    return summarize(kind, name, size, latencies, rss_before, peak_rss_mb(), traced_peaks)
+
+
+def run_case_isolated(kind, name, size, args):
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--case', f"{kind}:{name}", '--size', str(size),
+        '--repeat', str(args.repeat), '--seed', str(args.seed)
+    ]
+    if args.warm:
+        command.append('--warm')
+    if args.trace_memory:
+        command.append('--trace-memory')
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"{kind} {name} ({size} messages) failed:\n{completed.stderr[-2000:]}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment_info(args):
+    import spacy
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'spacy': spacy.__version__,
+        'numpy': np.__version__,
+        'model_version': main.current_model().version,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'warm_cache': args.warm,
+        'trace_memory': args.trace_memory,
+        'isolated': not args.in_process,
+        'settings': {name: os.environ[name] for name in RECORDED_SETTINGS if name in os.environ}
+    }
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    if baseline:
+        previous = {(r['kind'], r['name'], r['size']): r for r in baseline['results']}
+
+    traced = any(r.get('traced_peak_mb') is not None for r in results)
+    print()
+    print(f"{'Case':<40} {'Msgs':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'msgs/s':>11} {'Peak MB':>8}"
+          + (f" {'Traced MB':>10}" if traced else "") + (f" {'vs base':>8}" if baseline else ""))
+    print("-" * (101 + (11 if traced else 0) + (9 if baseline else 0)))
+    for r in results:
+        line = (
+            f"{r['kind'] + ' ' + r['name']:<40} {r['size']:>7} {r['latency_ms']['p50']:>10.2f} "
+            f"{r['latency_ms']['p95']:>10.2f} {r['latency_ms']['p99']:>10.2f} "
+            f"{r['throughput_msgs_per_sec'] or 0:>11.1f} {r['peak_rss_mb'] or 0:>8.1f}"
+        )
+        if traced:
+            line += f" {r.get('traced_peak_mb') or 0:>10.3f}"
+        before = previous.get((r['kind'], r['name'], r['size']))
+        if before and before['latency_ms']['p50']:
+            change = (r['latency_ms']['p50'] / before['latency_ms']['p50'] - 1) * 100
+            line += f" {change:>+7.1f}%"
+        print(line)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Benchmark the chat analysis pipeline in-process')
+    parser.add_argument('--sizes', type=str, default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated corpus sizes (messages)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=42, help='corpus seed')
+    parser.add_argument('--only', type=str, default=None, help='comma-separated case names to run')
+    parser.add_argument('--warm', action='store_true', help="don't clear the caches between runs")
+    parser.add_argument('--trace-memory', action='store_true', help='record peak allocations with tracemalloc')
+    parser.add_argument('--in-process', action='store_true', help='run every case in this process')
+    parser.add_argument('--out', type=str, default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--compare', type=str, default=None, help='earlier results file to compare against')
+    parser.add_argument('--case', type=str, default=None, help=argparse.SUPPRESS)  # kind:name, for child runs
+    parser.add_argument('--size', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    prepare_models()
+
+    # Child process: run one case and print its result as a JSON line
+    if args.case:
+        kind, name = args.case.split(':', 1)
+        print(json.dumps(run_case(kind, name, args.size, args.repeat, args.seed, args.warm, args.trace_memory)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    cases = [key for key in CASES if only is None or key[1] in only]
+
+    results = []
+    for size in sizes:
+        for kind, name in cases:
+            print(f"⏱️  {kind} {name}: {size} messages x {args.repeat}...")
+            if args.in_process:
+                results.append(run_case(kind, name, size, args.repeat, args.seed, args.warm, args.trace_memory))
+            else:
+                results.append(run_case_isolated(kind, name, size, args))
+
+    output = {'environment': environment_info(args), 'results': results}
+    with open(args.out, 'w') as out:
+        json.dump(output, out, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)
+    print_results(results, baseline)
+    print(f"\n✅ Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+evaluate_modes.py
+
+What each analysis mode (fast, standard, deep; see ANALYSIS_MODES in
+main.py) costs and how far its results are from deep, on a seeded corpus
+from generate_chat_csv.py. For every mode it reports:
+- throughput of /analyze and /weekly_report, with cold caches
+- per-message agreement with deep: F1 of the keyword set and of the topic set
+- per-project report agreement with deep: F1 of /analyze top_keywords and of
+  /weekly_report technical_topics, and the share of weekly reports whose
+  other fields are identical
+
+Usage:
+  python evaluate_modes.py                           # 2000 messages, 3 timed runs
+  python evaluate_modes.py --size 10000 --repeat 5 --out mode_evaluation.json
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+import benchmark
+import main
+
+# Report fields that depend on the mode (the activity summary names the main
+# topics); everything else should match deep exactly
+MODE_FIELDS = {'technical_topics', 'activity_summary'}
+
+
+def set_f1(found, expected):
+    found, expected = set(found), set(expected)
+    if not found and not expected:
+        return 1.0
+    return 2 * len(found & expected) / (len(found) + len(expected))
+
+
+def as_dict(result):
+    # Endpoint results are models, or pre-encoded responses with FAST_RESPONSES=1
+    if isinstance(result, main.Response):
+        return json.loads(result.body)
+    return result.model_dump()
+
+
+def clear_caches():
+    main.ANALYSIS_CACHE.clear()
+    main.RESPONSE_CACHE.clear()
+
+
+def throughput(corpus, mode, repeat):
+    """
+    Median messages per second of /analyze and /weekly_report in this mode.
+    """
+    endpoints = {
+        'analyze': lambda: main.analyze_chat(corpus.input, mode=mode),
+        'weekly_report': lambda: main.generate_weekly_mentor_report(corpus.input, mode=mode)
+    }
+    rates = {}
+    for name, call in endpoints.items():
+        latencies = []
+        for _ in range(repeat):
+            clear_caches()
+            started = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - started)
+        rates[name] = round(corpus.size / float(np.median(latencies)), 1)
+    return rates
+
+
+def message_results(corpus, mode):
+    clear_caches()
+    entries = main.analyze_texts(corpus.texts, with_topics=True, with_keywords=True, mode=mode)
+    return [(entry['keywords'], entry['noun_chunks']) for entry in entries]
+
+
+def project_reports(projects, mode):
+    clear_caches()
+    return {
+        project_id: (
+            as_dict(main.analyze_chat(main.AnalysisInput(messages=messages), mode=mode)),
+            as_dict(main.generate_weekly_mentor_report(main.AnalysisInput(messages=messages), mode=mode))
+        )
+        for project_id, messages in projects.items()
+    }
+
+
+def agreement(messages, reports, deep_messages, deep_reports):
+    keyword_f1 = [set_f1(found[0], expected[0]) for found, expected in zip(messages, deep_messages)]
+    topic_f1 = [set_f1(found[1], expected[1]) for found, expected in zip(messages, deep_messages)]
+    top_keywords, technical_topics, other_fields = [], [], []
+    for project_id, (summary, weekly) in reports.items():
+        deep_summary, deep_weekly = deep_reports[project_id]
+        top_keywords.append(set_f1(summary['top_keywords'], deep_summary['top_keywords']))
+        technical_topics.append(set_f1(weekly['technical_topics'], deep_weekly['technical_topics']))
+        other_fields.append(all(
+            weekly[field] == deep_weekly[field] for field in weekly if field not in MODE_FIELDS
+        ))
+    return {
+        'message_keyword_f1': round(float(np.mean(keyword_f1)), 4),
+        'message_topic_f1': round(float(np.mean(topic_f1)), 4),
+        'top_keywords_f1': round(float(np.mean(top_keywords)), 4),
+        'technical_topics_f1': round(float(np.mean(technical_topics)), 4),
+        'weekly_other_fields_equal': round(float(np.mean(other_fields)), 4)
+    }
+
+
+def print_results(results):
+    print()
+    print(f"{'Mode':<10} {'analyze/s':>11} {'weekly/s':>11} {'kw F1':>7} {'topic F1':>9} "
+          f"{'top_kw F1':>10} {'topics F1':>10} {'rest equal':>11}")
+    print("-" * 85)
+    for r in results:
+        a = r['agreement_with_deep']
+        print(
+            f"{r['mode']:<10} {r['throughput_msgs_per_sec']['analyze']:>11.1f} "
+            f"{r['throughput_msgs_per_sec']['weekly_report']:>11.1f} {a['message_keyword_f1']:>7.3f} "
+            f"{a['message_topic_f1']:>9.3f} {a['top_keywords_f1']:>10.3f} {a['technical_topics_f1']:>10.3f} "
+            f"{a['weekly_other_fields_equal']:>11.3f}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Evaluate the fast / standard / deep analysis modes')
+    parser.add_argument('--size', type=int, default=2000, help='corpus size (messages)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per mode and endpoint')
+    parser.add_argument('--seed', type=int, default=42, help='corpus seed')
+    parser.add_argument('--out', type=str, default='mode_evaluation.json', help='JSON results file')
+    args = parser.parse_args()
+
+    benchmark.prepare_models()
+    corpus = benchmark.Corpus(args.size, args.seed)
+    projects = defaultdict(list)
+    for row, message in zip(corpus.rows, corpus.messages):
+        projects[row[1]].append(message)
+
+    print(f"⏱️  Deep mode reference: {args.size} messages, {len(projects)} projects...")
+    deep_messages = message_results(corpus, 'deep')
+    deep_reports = project_reports(projects, 'deep')
+
+    results = []
+    for mode in main.ANALYSIS_MODES:
+        print(f"⏱️  {mode} mode...")
+        results.append({
+            'mode': mode,
+            'throughput_msgs_per_sec': throughput(corpus, mode, args.repeat),
+            'agreement_with_deep': agreement(
+                message_results(corpus, mode), project_reports(projects, mode), deep_messages, deep_reports
+            )
+        })
+
+    import spacy
+    output = {
+        'environment': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': benchmark.git_commit(),
+            'spacy': spacy.__version__,
+            'model_version': main.current_model().version,
+            'lemma_table_words': len(main.current_model().lemma_table.entries),
+            'summarizer': main.SUMMARIZER_MODEL,
+            'size': args.size,
+            'projects': len(projects),
+            'seed': args.seed,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    with open(args.out, 'w') as out:
+        json.dump(output, out, indent=2)
+
+    print_results(results)
+    print(f"\n✅ Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main_cli()
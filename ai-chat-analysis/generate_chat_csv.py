@@ -4,20 +4,34 @@ generate_chat_csv.py
 Generates a synthetic CSV of chat messages to be used by the ai-chat-analysis service.
 Usage:
   python generate_chat_csv.py --count 20000
+  python generate_chat_csv.py --count 20000 --seed 42 --start 2025-01-01   # reproducible
+
+  # vectorized mode for large corpora (numpy; parquet/arrow need pyarrow)
+  python generate_chat_csv.py --vectorized --count 10000000 --seed 7 --days 180 \
+      --projects 40 --users 600 --out corpus.parquet
 
 Output:
-  synthetic_chats.csv (written to same directory)
+  synthetic_chats.csv (written to same directory), or --out
 
 Fields:
   message_id, project_id, project_name, sender_id, sender_username, sender_role, channel, text, timestamp
 
-This script avoids external dependencies so it works in plain Python.
+The default mode avoids external dependencies so it works in plain Python.
+--vectorized builds rows in NumPy chunks on --workers processes and adds
+knobs for projects, users, activity curves and reply bursts. Its output is
+reproducible for a given seed, count and chunk size.
 """
 import csv
+import os
 import uuid
 import random
 import argparse
-from datetime import datetime, timedelta
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import NamedTuple
 
 # small set of sample names/roles/projects and text fragments to assemble messages
 USER_NAMES = [
@@ -53,85 +67,468 @@ SMALL_CHAT = [
 
 CHANNELS = ['project', 'personal', 'general', 'devops', 'random']
 
+HEADER = [
+    'message_id', 'project_id', 'project_name', 'sender_id', 'sender_username',
+    'sender_role', 'channel', 'text', 'timestamp'
+]
+
 
-def random_message():
+def random_message(rng=random):
     # build one message by randomly picking fragments
-    if random.random() < 0.12:
+    if rng.random() < 0.12:
         # short chat
-        return random.choice(SMALL_CHAT)
-    if random.random() < 0.05:
+        return rng.choice(SMALL_CHAT)
+    if rng.random() < 0.05:
         # longer status-type message
         return (
-            f"{random.choice(OPENERS)} I {random.choice(VERBS)} the {random.choice(OBJECTS)} "
-            f"#{random.randint(1,400)} and {random.choice(TAILS)}"
+            f"{rng.choice(OPENERS)} I {rng.choice(VERBS)} the {rng.choice(OBJECTS)} "
+            f"#{rng.randint(1,400)} and {rng.choice(TAILS)}"
         )
     # normal sentence
-    return f"{random.choice(OPENERS)} {random.choice(VERBS)} {random.choice(OBJECTS)} {random.choice(TAILS)}"
+    return f"{rng.choice(OPENERS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(TAILS)}"
+
+
+def new_message_id(rng):
+    # uuid4-style id drawn from rng, so seeded runs are reproducible
+    if rng is random:
+        return str(uuid.uuid4())
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def iter_rows(count, seed=None, start_time=None):
+    """
+    Yield rows (in HEADER order) for `count` primary messages plus the
+    occasional thread replies. With a seed (and a fixed start_time) the
+    output is identical on every run.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    if start_time is None:
+        start_time = datetime.utcnow() - timedelta(days=90)
+
+    for i in range(count):
+        # pick project and user
+        project_id, project_name = rng.choice(PROJECTS)
+        username = rng.choice(USER_NAMES)
+        sender_id = f"user-{zlib.crc32(username.encode()) % 100000}"  # stable id
+        sender_role = rng.choices(ROLES, weights=[70, 10, 10, 10], k=1)[0]
+        channel = rng.choices(CHANNELS, weights=[60, 10, 15, 10, 5], k=1)[0]
+
+        # create timestamp distributed over last 90 days, but more weight to recent
+        days_offset = int(rng.paretovariate(1.5)) % 90
+        seconds_offset = rng.randint(0, 24 * 3600 - 1)
+        ts = start_time + timedelta(days=days_offset, seconds=seconds_offset)
+
+        text = random_message(rng)
 
+        message_id = new_message_id(rng)
 
-def generate_rows(count, out_path):
-    start_time = datetime.utcnow() - timedelta(days=90)
+        yield [
+            message_id,
+            project_id,
+            project_name,
+            sender_id,
+            username,
+            sender_role,
+            channel,
+            text,
+            ts.isoformat() + 'Z'
+        ]
+
+        # occasional multi-line / long message
+        if i % 5000 == 0 and i != 0:
+            # add a conversational block to simulate threads
+            for j in range(3):
+                reply_ts = ts + timedelta(minutes=j+1)
+                yield [
+                    new_message_id(rng),
+                    project_id,
+                    project_name,
+                    f"user-{rng.randint(1000,9999)}",
+                    rng.choice(USER_NAMES),
+                    rng.choice(ROLES),
+                    channel,
+                    "Reply: " + random_message(rng),
+                    reply_ts.isoformat() + 'Z'
+                ]
+
+
+def generate_rows(count, out_path, seed=None, start_time=None):
     with open(out_path, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow([
-            'message_id', 'project_id', 'project_name', 'sender_id', 'sender_username',
-            'sender_role', 'channel', 'text', 'timestamp'
-        ])
-
-        for i in range(count):
-            # pick project and user
-            project_id, project_name = random.choice(PROJECTS)
-            username = random.choice(USER_NAMES)
-            sender_id = f"user-{abs(hash(username)) % 100000}"  # stable-ish id
-            sender_role = random.choices(ROLES, weights=[70, 10, 10, 10], k=1)[0]
-            channel = random.choices(CHANNELS, weights=[60, 10, 15, 10, 5], k=1)[0]
-
-            # create timestamp distributed over last 90 days, but more weight to recent
-            days_offset = int(random.paretovariate(1.5)) % 90
-            seconds_offset = random.randint(0, 24 * 3600 - 1)
-            ts = start_time + timedelta(days=days_offset, seconds=seconds_offset)
-
-            text = random_message()
-
-            message_id = str(uuid.uuid4())
-
-            writer.writerow([
-                message_id,
-                project_id,
-                project_name,
-                sender_id,
-                username,
-                sender_role,
-                channel,
-                text,
-                ts.isoformat() + 'Z'
-            ])
-
-            # occasional multi-line / long message
-            if i % 5000 == 0 and i != 0:
-                # add a conversational block to simulate threads
-                for j in range(3):
-                    mid = str(uuid.uuid4())
-                    reply_ts = ts + timedelta(minutes=j+1)
-                    writer.writerow([
-                        mid,
-                        project_id,
-                        project_name,
-                        f"user-{random.randint(1000,9999)}",
-                        random.choice(USER_NAMES),
-                        random.choice(ROLES),
-                        channel,
-                        "Reply: " + random_message(),
-                        reply_ts.isoformat() + 'Z'
-                    ])
+        writer.writerow(HEADER)
+        writer.writerows(iter_rows(count, seed, start_time))
 
     print(f"Wrote {count} primary messages (+ occasional thread replies) to {out_path}")
 
 
+# --- vectorized mode (--vectorized): large corpora for load and scale testing ---
+# Rows are built in NumPy batches of --chunk-size primary messages, each
+# chunk from its own seed stream (seed + chunk index), so the output only
+# depends on the seed, count and chunk size, not on how many workers ran.
+# Needs numpy; Parquet/Arrow output also needs pyarrow (requirements-optional.txt).
+
+CHANNEL_WEIGHTS = [60, 10, 15, 10, 5]
+ROLE_WEIGHTS = [70, 10, 10, 10]
+
+# relative activity per hour of day (UTC)
+DIURNAL_PROFILES = {
+    'office': [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.5, 1.2, 2.5, 4.0, 4.5, 4.2,
+               3.0, 3.8, 4.3, 4.2, 3.8, 3.0, 2.0, 1.5, 1.3, 1.1, 0.8, 0.4],
+    'flat': [1.0] * 24
+}
+
+# seconds between replies in a thread burst (exponential mean)
+REPLY_GAP_SECONDS = 90
+
+# exponent > 1 makes the first members of each project post the most
+USER_ACTIVITY_SKEW = 1.6
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'arrow']
+
+
+class CorpusConfig(NamedTuple):
+    seed: int
+    start_epoch: int        # first second of the window (UTC)
+    days: int = 90
+    projects: int = 5
+    users: int = 20
+    diurnal: str = 'office'
+    weekend_factor: float = 0.3
+    reply_rate: float = 0.02   # chance that a message starts a reply burst
+    burst_size: float = 3.0    # mean replies per burst
+
+
+def project_table(count):
+    # the named sample projects first, then numbered ones
+    extra = [(f"proj-{i + 1}", f"Project {i + 1}") for i in range(len(PROJECTS), count)]
+    return (PROJECTS + extra)[:count]
+
+
+def user_table(count):
+    # alice, bob, ..., trent, alice2, bob2, ...
+    return [
+        USER_NAMES[i % len(USER_NAMES)] + (str(i // len(USER_NAMES) + 1) if i >= len(USER_NAMES) else '')
+        for i in range(count)
+    ]
+
+
+@lru_cache(maxsize=4)
+def corpus_tables(config):
+    """
+    Lookup tables shared by every chunk: names, per-user roles, project
+    membership, activity curves and the fixed message texts.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(np.random.SeedSequence(config.seed))
+    usernames = user_table(config.users)
+    roles = rng.choice(len(ROLES), config.users, p=np.array(ROLE_WEIGHTS) / sum(ROLE_WEIGHTS))
+
+    # user u belongs to project u % projects (projects share users if there are fewer)
+    members = [
+        np.arange(p, config.users, config.projects) if p < config.users else np.array([p % config.users])
+        for p in range(config.projects)
+    ]
+
+    first_weekday = datetime.fromtimestamp(config.start_epoch, timezone.utc).weekday()
+    day_weights = np.array([
+        config.weekend_factor if (first_weekday + day) % 7 >= 5 else 1.0
+        for day in range(config.days)
+    ])
+    hour_weights = np.array(DIURNAL_PROFILES[config.diurnal])
+
+    normal = [f"{o} {v} {ob} {t}" for o in OPENERS for v in VERBS for ob in OBJECTS for t in TAILS]
+
+    return {
+        'projects': project_table(config.projects),
+        'usernames': usernames,
+        'sender_ids': [f"user-{zlib.crc32(name.encode()) % 100000}" for name in usernames],
+        'roles': roles,
+        'member_flat': np.concatenate(members),
+        'member_start': np.cumsum([0] + [len(m) for m in members[:-1]]),
+        'member_count': np.array([len(m) for m in members]),
+        'day_p': day_weights / day_weights.sum(),
+        'hour_p': hour_weights / hour_weights.sum(),
+        'channel_p': np.array(CHANNEL_WEIGHTS) / sum(CHANNEL_WEIGHTS),
+        'texts': np.array(SMALL_CHAT + normal, dtype=object)
+    }
+
+
+def pick_users(rng, projects, tables):
+    k = (rng.random(len(projects)) ** USER_ACTIVITY_SKEW * tables['member_count'][projects]).astype('int64')
+    return tables['member_flat'][tables['member_start'][projects] + k]
+
+
+def pick_texts(rng, count, tables):
+    # same mix as random_message(): 12% small chat, 5% of the rest long status messages
+    import numpy as np
+
+    small = rng.random(count) < 0.12
+    long = ~small & (rng.random(count) < 0.05)
+    index = np.where(small,
+                     rng.integers(0, len(SMALL_CHAT), count),
+                     rng.integers(len(SMALL_CHAT), len(tables['texts']), count))
+    texts = tables['texts'][index]
+
+    rows = np.flatnonzero(long)
+    if len(rows):
+        parts = [rng.integers(0, len(table), len(rows)) for table in (OPENERS, VERBS, OBJECTS, TAILS)]
+        numbers = rng.integers(1, 401, len(rows))
+        texts[rows] = [
+            f"{OPENERS[o]} I {VERBS[v]} the {OBJECTS[ob]} #{n} and {TAILS[t]}"
+            for o, v, ob, t, n in zip(*parts, numbers)
+        ]
+    return texts
+
+
+def uuid_strings(rng, count):
+    # random version-4 UUIDs from the seeded stream
+    import numpy as np
+
+    raw = np.frombuffer(rng.bytes(16 * count), dtype=np.uint8).reshape(count, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hexed = raw.tobytes().hex()
+    return [
+        f"{hexed[i:i + 8]}-{hexed[i + 8:i + 12]}-{hexed[i + 12:i + 16]}-{hexed[i + 16:i + 20]}-{hexed[i + 20:i + 32]}"
+        for i in range(0, 32 * count, 32)
+    ]
+
+
+def build_chunk(config, chunk_index, size):
+    """
+    Columns for `size` primary messages plus their reply bursts, each reply
+    right after its parent (as in iter_rows).
+    """
+    import numpy as np
+
+    tables = corpus_tables(config)
+    rng = np.random.default_rng(np.random.SeedSequence(config.seed, spawn_key=(chunk_index,)))
+
+    # primary messages: activity follows the weekly and diurnal curves
+    project = rng.integers(0, config.projects, size)
+    user = pick_users(rng, project, tables)
+    channel = rng.choice(len(CHANNELS), size, p=tables['channel_p'])
+    seconds = (config.start_epoch
+               + rng.choice(config.days, size, p=tables['day_p']) * 86400
+               + rng.choice(24, size, p=tables['hour_p']) * 3600
+               + rng.integers(0, 3600, size))
+    text = pick_texts(rng, size, tables)
+
+    # thread reply bursts: same project and channel, a few minutes apart
+    parents = np.flatnonzero(rng.random(size) < config.reply_rate)
+    burst_sizes = 1 + rng.poisson(max(config.burst_size - 1, 0), len(parents))
+    parent = np.repeat(parents, burst_sizes)
+    group_start = np.repeat(np.cumsum(burst_sizes) - burst_sizes, burst_sizes)
+    gaps = np.cumsum(rng.exponential(REPLY_GAP_SECONDS, len(parent)))
+    offsets = gaps - np.concatenate([[0.0], gaps])[group_start]
+    reply_project = project[parent]
+
+    position = np.concatenate([np.arange(size), parent])
+    reply_number = np.concatenate([np.zeros(size, dtype='int64'), np.arange(len(parent)) - group_start + 1])
+    order = np.lexsort((reply_number, position))
+
+    project = np.concatenate([project, reply_project])[order]
+    user = np.concatenate([user, pick_users(rng, reply_project, tables)])[order]
+    channel = np.concatenate([channel, channel[parent]])[order]
+    seconds = np.concatenate([seconds, seconds[parent] + np.ceil(offsets).astype('int64')])[order]
+    text = np.concatenate([text, "Reply: " + pick_texts(rng, len(parent), tables)])[order]
+
+    return {
+        'message_id': uuid_strings(rng, len(order)),
+        'project': project,
+        'user': user,
+        'channel': channel,
+        'seconds': seconds,
+        'text': text
+    }
+
+
+def csv_field(value):
+    # csv.writer's minimal quoting, for one column
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def chunk_csv(config, chunk_index, size):
+    """
+    The chunk as CSV text, identical to csv.writer output. Only the text
+    needs quoting; every other column comes from tables without separators.
+    """
+    import numpy as np
+
+    tables = corpus_tables(config)
+    columns = build_chunk(config, chunk_index, size)
+    user = columns['user']
+    timestamps = columns['seconds'].astype('datetime64[s]').astype(str).astype(object) + 'Z'
+
+    fields = [
+        columns['message_id'],
+        np.array([p[0] for p in tables['projects']], dtype=object)[columns['project']],
+        np.array([p[1] for p in tables['projects']], dtype=object)[columns['project']],
+        np.array(tables['sender_ids'], dtype=object)[user],
+        np.array(tables['usernames'], dtype=object)[user],
+        np.array(ROLES, dtype=object)[tables['roles'][user]],
+        np.array(CHANNELS, dtype=object)[columns['channel']],
+        [csv_field(text) for text in columns['text']],
+        timestamps
+    ]
+    return "\r\n".join(map(",".join, zip(*fields))) + "\r\n"
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('message_id', pa.string()),
+        ('project_id', dictionary),
+        ('project_name', dictionary),
+        ('sender_id', dictionary),
+        ('sender_username', dictionary),
+        ('sender_role', dictionary),
+        ('channel', dictionary),
+        ('text', pa.string()),
+        ('timestamp', pa.timestamp('s', tz='UTC'))
+    ])
+
+
+def chunk_arrow(config, chunk_index, size):
+    # categorical columns are dictionary-encoded against the shared tables
+    import pyarrow as pa
+
+    tables = corpus_tables(config)
+    columns = build_chunk(config, chunk_index, size)
+
+    def encoded(indices, values):
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(values, pa.string()))
+
+    user_roles = tables['roles'][columns['user']]
+    return pa.record_batch([
+        pa.array(columns['message_id'], pa.string()),
+        encoded(columns['project'], [p[0] for p in tables['projects']]),
+        encoded(columns['project'], [p[1] for p in tables['projects']]),
+        encoded(columns['user'], tables['sender_ids']),
+        encoded(columns['user'], tables['usernames']),
+        encoded(user_roles, ROLES),
+        encoded(columns['channel'], CHANNELS),
+        pa.array(columns['text'], pa.string()),
+        pa.array(columns['seconds'], pa.timestamp('s', tz='UTC'))
+    ], schema=arrow_schema())
+
+
+def output_format(out_path, fmt=None):
+    if fmt:
+        return fmt
+    suffix = os.path.splitext(out_path)[1].lower()
+    return {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}.get(suffix, 'csv')
+
+
+def generate_corpus(count, out_path, config, fmt=None, workers=None, chunk_size=100000):
+    """
+    Write `count` primary messages (plus reply bursts) built in vectorized
+    chunks across `workers` processes. Chunks are written in order, with at
+    most two per worker in flight so memory stays bounded.
+    """
+    fmt = output_format(out_path, fmt)
+    workers = max(1, workers or os.cpu_count() or 1)
+    sizes = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+    build = chunk_csv if fmt == 'csv' else chunk_arrow
+
+    if fmt == 'csv':
+        out = open(out_path, 'w', newline='', encoding='utf-8')
+        csv.writer(out).writerow(HEADER)
+        write = out.write
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if fmt == 'parquet':
+            out = pq.ParquetWriter(out_path, arrow_schema())
+        else:
+            out = pa.ipc.new_file(out_path, arrow_schema())
+        write = out.write_batch
+
+    rows = 0
+
+    def emit(chunk):
+        nonlocal rows
+        rows += chunk.count('\n') if fmt == 'csv' else chunk.num_rows
+        write(chunk)
+
+    try:
+        if workers == 1:
+            for index, size in enumerate(sizes):
+                emit(build(config, index, size))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for index, size in enumerate(sizes):
+                    pending.append(executor.submit(build, config, index, size))
+                    if len(pending) >= 2 * workers:
+                        emit(pending.popleft().result())
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        out.close()
+
+    print(f"Wrote {count} primary messages ({rows} rows with thread replies) to {out_path} [{fmt}]")
+    return rows
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Generate synthetic chat CSV')
     parser.add_argument('--count', type=int, default=20000, help='number of messages to generate')
     parser.add_argument('--out', type=str, default='synthetic_chats.csv', help='output CSV filename')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for a reproducible corpus')
+    parser.add_argument('--start', type=str, default=None,
+                        help='first day of the window (YYYY-MM-DD); default: 90 (or --days) days ago')
+
+    fast = parser.add_argument_group('vectorized mode')
+    fast.add_argument('--vectorized', action='store_true', help='build rows in NumPy chunks (needs numpy)')
+    fast.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                      help='output format (default: from the --out extension); parquet/arrow need pyarrow')
+    fast.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    fast.add_argument('--chunk-size', type=int, default=100000, help='primary messages per chunk')
+    fast.add_argument('--days', type=int, default=90, help='length of the time window in days')
+    fast.add_argument('--projects', type=int, default=len(PROJECTS), help='number of projects')
+    fast.add_argument('--users', type=int, default=len(USER_NAMES), help='number of users')
+    fast.add_argument('--diurnal', choices=sorted(DIURNAL_PROFILES), default='office',
+                      help='hour-of-day activity curve')
+    fast.add_argument('--weekend-factor', type=float, default=0.3,
+                      help='weekend activity relative to weekdays')
+    fast.add_argument('--reply-rate', type=float, default=0.02,
+                      help='chance that a message starts a thread reply burst')
+    fast.add_argument('--burst-size', type=float, default=3.0, help='mean replies per burst')
     args = parser.parse_args()
 
-    generate_rows(args.count, args.out)
+    start_time = datetime.fromisoformat(args.start) if args.start else None
+    if not args.vectorized and output_format(args.out, args.format) != 'csv':
+        parser.error('parquet/arrow output needs --vectorized')
+    if output_format(args.out, args.format) != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('parquet/arrow output needs pyarrow (pip install -r requirements-optional.txt)')
+
+    if args.vectorized:
+        import numpy as np
+
+        if start_time is None:
+            start_time = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=args.days)
+        config = CorpusConfig(
+            seed=args.seed if args.seed is not None else np.random.SeedSequence().entropy,
+            start_epoch=int(start_time.replace(tzinfo=timezone.utc).timestamp()),
+            days=args.days,
+            projects=args.projects,
+            users=args.users,
+            diurnal=args.diurnal,
+            weekend_factor=args.weekend_factor,
+            reply_rate=args.reply_rate,
+            burst_size=args.burst_size
+        )
+        generate_corpus(args.count, args.out, config, fmt=args.format,
+                        workers=args.workers, chunk_size=args.chunk_size)
+    else:
+        generate_rows(args.count, args.out, seed=args.seed, start_time=start_time)
@@ -2,32 +2,35 @@
 # This file creates an AI analysis service for project group chats.
 
 # --- 1. All Necessary Imports ---
-# Import FastAPI and Uvicorn
-from fastapi import FastAPI
-import uvicorn
+# Record when the import started, to report import-to-first-request time
+import time
+IMPORT_STARTED = time.perf_counter()
+
+# Import FastAPI
+# (uvicorn is only needed when running this file directly)
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
 
 # Import BaseModel and List from Pydantic
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List
 
-# Import SentimentIntensityAnalyzer from vaderSentiment.sentiment
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-
-# Import spacy
-import spacy
-
-# Import pipeline from transformers
-from transformers import pipeline
+# spaCy, VADER and transformers are heavy imports (transformers pulls in torch),
+# so they are imported lazily by get_nlp(), get_sia() and get_summarizer()
 
 # Import Counter from collections
 from collections import Counter, defaultdict
+from itertools import chain, groupby
+from operator import itemgetter
 
 # Import warnings to ignore specific transformer warnings
 import warnings
 
 # Import datetime for weekly report tracking
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Optional
 
 # Import CSV for loading synthetic data
 import csv
@@ -37,6 +40,42 @@ from pathlib import Path
 # Import re for pattern matching
 import re
 
+# Import hashlib and threading for the per-message analysis cache
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Import pickle for the persisted model artifact
+import pickle
+
+# Import mmap, shutil, struct and array for the binary training corpus
+import mmap
+import shutil
+import struct
+from array import array
+
+# Import NumPy for columnar message batches and vectorized scoring
+import numpy as np
+
+# Import heapq for the top-k sketch
+import heapq
+
+# Import bisect and contextmanager for the metrics histograms and stage timers
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Import profiling tools for opt-in request profiling
+import cProfile
+import functools
+import json
+import pstats
+import tracemalloc
+import uuid
+from contextvars import ContextVar
+
+# Import concurrent.futures for parallel batch reports
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
 # --- 2. Suppress Warnings ---
 # Suppress the specific transformers warning about model length
 warnings.filterwarnings("ignore", message=".*sequence length is longer than.*")
@@ -113,207 +152,1282 @@ class WeeklyMentorReport(BaseModel):
     progress_updates: int  # New field
     collaboration_score: float  # New field (0-100)
 
+# Models for the incremental ingest API
+class IngestMessage(ChatMessage):
+    message_id: str  # Used to reject messages that were already ingested
+
+class IngestInput(BaseModel):
+    messages: List[IngestMessage]
+
+class IngestResult(BaseModel):
+    project_id: str
+    accepted: int
+    duplicates: List[str]  # message_ids that were already ingested
+    weeks: List[str]       # ISO weeks (e.g. "2025-W34") that received messages
+
+# Models for the multi-project batch report
+class ProjectMessages(BaseModel):
+    project_id: str
+    messages: List[ChatMessage]
+
+class BatchReportInput(BaseModel):
+    projects: List[ProjectMessages]
+
+class ProjectWeeklyReport(BaseModel):
+    project_id: str
+    report: Optional[WeeklyMentorReport] = None
+    error: Optional[str] = None  # Set instead of report if this project failed
+
+class BatchReportResult(BaseModel):
+    reports: List[ProjectWeeklyReport]
+
+# Models for time-bucketed activity reports
+class TimelineInput(AnalysisInput):
+    bucket: str = "day"              # "day" or "week" (ISO weeks, starting Monday)
+    windows: List[int] = [7, 14, 30]  # Trailing windows in days, ending at `end`
+    end: Optional[str] = None        # ISO timestamp the windows end at (default: now)
+
+class ActivityStats(BaseModel):
+    start: str  # ISO timestamp, inclusive
+    end: str    # ISO timestamp, exclusive
+    message_count: int
+    active_users: int
+    avg_sentiment: float
+    tasks_completed: int
+    blockers_reported: int
+    participation: Dict[str, int]  # username -> messages
+
+class ActivityWindow(ActivityStats):
+    days: int
+
+class ActivityTimeline(BaseModel):
+    bucket: str
+    buckets: List[ActivityStats]  # Buckets without messages are omitted
+    windows: List[ActivityWindow]
+    undated_messages: int         # Messages without a usable timestamp
+
+# --- Metrics ---
+# Request, stage and training metrics, rendered in the Prometheus text format
+# by GET /metrics. Recording is a bisect and a few additions under a lock, so
+# it stays on in the hot path. Metrics only cover this process: stages run on
+# the process pool (sharded and batch reports) are not included.
+
+# Histogram bucket upper bounds: seconds and message counts
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TRAINING_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+INPUT_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class CounterMetric:
+    """
+    Monotonic counter with one series per label combination.
+    """
+    
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = sorted(self.values.items())
+        for labels, value in series:
+            lines.append(f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}")
+        return lines
+
+class HistogramMetric:
+    """
+    Fixed-bucket histogram with one series per label combination.
+    Each series keeps per-bucket counts plus the sum and count; buckets are
+    made cumulative only when rendered.
+    """
+    
+    def __init__(self, name: str, help_text: str, buckets: tuple, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Bucket counts (the last one is +Inf), then sum and count
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = 'le="' + (bound if bound == "+Inf" else format_value(float(bound))) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(series[-2])}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+REQUEST_COUNT = CounterMetric(
+    "chat_analysis_requests_total", "HTTP requests by route, method and status.",
+    ("endpoint", "method", "status")
+)
+REQUEST_LATENCY = HistogramMetric(
+    "chat_analysis_request_duration_seconds", "Time to answer a request, by route.",
+    LATENCY_BUCKETS, ("endpoint",)
+)
+STAGE_LATENCY = HistogramMetric(
+    "chat_analysis_stage_duration_seconds",
+    "Time spent in each analysis stage per call (parse_topics, parse_keywords, sentiment, classification, aggregation, report, summary).",
+    LATENCY_BUCKETS, ("stage",)
+)
+MESSAGES_PROCESSED = CounterMetric(
+    "chat_analysis_messages_processed_total",
+    "Messages analyzed, by route; rate() of it gives messages per second.",
+    ("endpoint",)
+)
+INPUT_SIZE = HistogramMetric(
+    "chat_analysis_input_messages", "Messages per request, by route.",
+    INPUT_SIZE_BUCKETS, ("endpoint",)
+)
+TRAINING_DURATION = HistogramMetric(
+    "chat_analysis_training_duration_seconds", "Time to train a model snapshot from the CSV corpus.",
+    TRAINING_BUCKETS
+)
+
+METRICS = [REQUEST_COUNT, REQUEST_LATENCY, STAGE_LATENCY, MESSAGES_PROCESSED, INPUT_SIZE, TRAINING_DURATION]
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Record the time spent in the with-block as one observation of stage
+    (and in the request's profile, when it is being profiled).
+    """
+    profile = ACTIVE_PROFILE.get()
+    memory_before = profile.stage_started() if profile is not None else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.observe(elapsed, (stage,))
+        if profile is not None:
+            profile.stage_finished(stage, elapsed, memory_before)
+
+def record_input(endpoint: str, message_count: int):
+    # Input size and throughput for one request's messages
+    INPUT_SIZE.observe(message_count, (endpoint,))
+    MESSAGES_PROCESSED.inc((endpoint,), message_count)
+
+# --- Request Profiling ---
+# Opt-in profiling of single requests, for reproducing a slow report on a real
+# payload. With PROFILING_ENABLED=1, a request sent with "X-Profile: 1" or
+# "?profile=1" is run under cProfile with tracemalloc tracking per-stage
+# allocation peaks. The results are written to PROFILE_DIR and the response
+# names them in X-Profile-Id (see GET /profiles/{profile_id}).
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Functions listed in a profile summary, by cumulative time
+PROFILE_TOP_FUNCTIONS = 30
+
+# The profile of the request being handled, if it asked for one
+ACTIVE_PROFILE = ContextVar("active_profile", default=None)
+
+# One CPU profile at a time: profilers on concurrent requests would see each other's calls
+CPU_PROFILE_LOCK = threading.Lock()
+
+# tracemalloc is process-wide, so it runs while any profiled request does.
+# It is only stopped if we started it (not e.g. by PYTHONTRACEMALLOC)
+TRACEMALLOC_LOCK = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+class RequestProfile:
+    """
+    CPU profile, per-stage timings and allocation peaks of one request.
+    Stages are the ones timed for /metrics; allocation peaks are relative to
+    the traced memory at the start of the stage and include anything other
+    requests allocate meanwhile, so profile with little else running.
+    """
+    
+    def __init__(self, method: str, path: str):
+        self.profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow().isoformat() + 'Z'
+        self.profiler = cProfile.Profile()
+        self.cpu_profiled = False
+        self.stages = {}
+        self.peak_bytes = 0
+    
+    def run(self, func, *args, **kwargs):
+        """
+        Call func under this request's CPU profiler (skipped while another
+        request is being CPU profiled).
+        """
+        if not CPU_PROFILE_LOCK.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            self.profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.profiler.disable()
+                self.cpu_profiled = True
+        finally:
+            CPU_PROFILE_LOCK.release()
+    
+    @staticmethod
+    def stage_started() -> Optional[int]:
+        # Traced memory when a stage starts, with the peak reset to it
+        if not tracemalloc.is_tracing():
+            return None
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+    
+    def stage_finished(self, stage: str, seconds: float, memory_before: Optional[int] = None):
+        record = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'peak_alloc_bytes': None})
+        record['calls'] += 1
+        record['seconds'] += seconds
+        if memory_before is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            record['peak_alloc_bytes'] = max(record['peak_alloc_bytes'] or 0, peak - memory_before)
+            self.peak_bytes = max(self.peak_bytes, peak)
+    
+    def summary(self, wall_seconds: float) -> Dict:
+        top_functions = []
+        if self.cpu_profiled:
+            stats = pstats.Stats(self.profiler).stats
+            for (filename, line, function), (_, ncalls, tottime, cumtime, _) in sorted(
+                    stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]:
+                top_functions.append({
+                    "function": f"{filename}:{line}({function})",
+                    "ncalls": ncalls,
+                    "tottime": round(tottime, 6),
+                    "cumtime": round(cumtime, 6)
+                })
+        
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_profiled": self.cpu_profiled,
+            "peak_traced_bytes": self.peak_bytes,
+            "stages": {
+                stage: dict(record, seconds=round(record['seconds'], 6))
+                for stage, record in sorted(self.stages.items())
+            },
+            "top_functions": top_functions
+        }
+    
+    def save(self, directory: str, wall_seconds: float) -> Dict:
+        """
+        Write <profile_id>.json (the summary) and, if CPU profiled,
+        <profile_id>.prof (pstats format, for snakeviz or pstats).
+        """
+        os.makedirs(directory, exist_ok=True)
+        summary = self.summary(wall_seconds)
+        if self.cpu_profiled:
+            self.profiler.dump_stats(os.path.join(directory, f"{self.profile_id}.prof"))
+        with open(os.path.join(directory, f"{self.profile_id}.json"), 'w') as out:
+            json.dump(summary, out, indent=2)
+        return summary
+
+def profile_requested(request: Request) -> bool:
+    flag = request.headers.get('x-profile') or request.query_params.get('profile') or ''
+    return flag.lower() in ('1', 'true', 'yes')
+
+def start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with TRACEMALLOC_LOCK:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+def stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with TRACEMALLOC_LOCK:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+def run_profiled(func, *args, **kwargs):
+    """
+    Call func, under the current request's CPU profiler if it has one.
+    """
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    return profile.run(func, *args, **kwargs)
+
+def profiled(func):
+    """
+    Endpoint decorator: run the endpoint body under the request's profiler.
+    Sync endpoints run on a threadpool thread, and cProfile only sees the
+    thread it was enabled on, so the profiler is enabled there.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_profiled(func, *args, **kwargs)
+    return wrapper
+
 # --- 4. Load AI Models (Global variables) ---
-# These models are loaded once when the app starts.
+# Models are loaded lazily on first use (or by the optional warm-up),
+# so importing this module and answering health checks stays fast.
 
-# Load the VADER sentiment analyzer
-sia = SentimentIntensityAnalyzer()
+MODEL_LOAD_LOCK = threading.Lock()
 
-# Load the 'en_core_web_sm' spaCy model
-nlp = spacy.load("en_core_web_sm")
+# Seconds spent loading each model, reported by /ready
+MODEL_LOAD_SECONDS = {}
 
-# Load the 'summarization' pipeline from transformers
-# Commented out for faster startup - using simple summarization instead
-# summarizer = pipeline("summarization", model="t5-small")
-summarizer = None  # Will use simple text truncation
+_sia = None
+_nlp = None
+_summarizer = None
 
-# --- Helper Functions for Advanced Analysis ---
+def get_sia():
+    """
+    Return the VADER sentiment analyzer, loading it on first use.
+    """
+    global _sia
+    if _sia is None:
+        with MODEL_LOAD_LOCK:
+            if _sia is None:
+                started = time.perf_counter()
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                _sia = SentimentIntensityAnalyzer()
+                MODEL_LOAD_SECONDS['vader'] = round(time.perf_counter() - started, 3)
+    return _sia
+
+def get_nlp():
+    """
+    Return the 'en_core_web_sm' spaCy model, loading it on first use.
+    NER is never used by any endpoint, so it is not loaded at all.
+    """
+    global _nlp
+    if _nlp is None:
+        with MODEL_LOAD_LOCK:
+            if _nlp is None:
+                started = time.perf_counter()
+                import spacy
+                _nlp = spacy.load("en_core_web_sm", exclude=["ner"])
+                MODEL_LOAD_SECONDS['spacy'] = round(time.perf_counter() - started, 3)
+    return _nlp
+
+# Set SUMMARIZER_MODEL (e.g. "t5-small") to summarize /analyze input with
+# transformers; by default a simple text truncation is used instead
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL")
+
+def get_summarizer():
+    """
+    Return the transformers summarization pipeline, or None when disabled.
+    transformers (and torch) are only imported if a summarizer is configured.
+    """
+    global _summarizer
+    if _summarizer is None and SUMMARIZER_MODEL:
+        with MODEL_LOAD_LOCK:
+            if _summarizer is None:
+                started = time.perf_counter()
+                from transformers import pipeline
+                _summarizer = pipeline("summarization", model=SUMMARIZER_MODEL)
+                MODEL_LOAD_SECONDS['summarizer'] = round(time.perf_counter() - started, 3)
+    return _summarizer
 
-# Global variables for trained patterns
-TRAINED_PATTERNS = {
-    'task_completion': [],
-    'blockers': [],
-    'progress_updates': [],
-    'collaboration': []
+# Batch settings for nlp.pipe (override with environment variables)
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", "256"))
+NLP_N_PROCESS = int(os.getenv("NLP_N_PROCESS", "1"))
+
+# spaCy components each analysis step actually needs; everything else is disabled
+PIPELINE_COMPONENTS = {
+    'keywords': ['tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer'],  # token.lemma_
+    'topics': ['tok2vec', 'tagger', 'attribute_ruler', 'parser']         # doc.noun_chunks
 }
 
-# Statistics from training data
-TRAINING_STATS = {
-    'total_messages': 0,
-    'avg_message_length': 0,
-    'common_patterns': {},
-    'user_activity_distribution': {}
+# --- Helper Functions for Advanced Analysis ---
+
+def parse_texts(texts: List[str], purpose: str):
+    """
+    Parse texts in batches with nlp.pipe, running only the components
+    listed in PIPELINE_COMPONENTS for the given purpose.
+    Yields one Doc per text, in order.
+    """
+    nlp = get_nlp()
+    enabled = PIPELINE_COMPONENTS[purpose]
+    disable = [name for name in nlp.pipe_names if name not in enabled]
+    
+    # Worker processes only pay off once there are several batches to share
+    n_process = NLP_N_PROCESS if len(texts) > NLP_BATCH_SIZE else 1
+    
+    return nlp.pipe(texts, batch_size=NLP_BATCH_SIZE, n_process=n_process, disable=disable)
+
+def split_long_text(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into pieces of at most max_chars, breaking at the last
+    whitespace before the limit where there is one.
+    """
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut])
+        text = text[cut:]
+    pieces.append(text)
+    return pieces
+
+def parse_text_pieces(texts: List[str], purpose: str):
+    """
+    Like parse_texts(), but yields a list of Docs per text: texts longer
+    than spaCy's nlp.max_length are parsed as several pieces instead of
+    failing. Texts that fit give a single Doc, exactly as before.
+    """
+    max_chars = get_nlp().max_length
+    pieces = []
+    owners = []
+    for index, text in enumerate(texts):
+        for piece in split_long_text(text, max_chars):
+            pieces.append(piece)
+            owners.append(index)
+    
+    for _, group in groupby(zip(owners, parse_texts(pieces, purpose)), key=lambda item: item[0]):
+        yield [doc for _, doc in group]
+
+# --- Keyword Tables ---
+
+# Technical keywords indicating actual work
+TECHNICAL_KEYWORDS = [
+    'code', 'function', 'class', 'method', 'api', 'endpoint', 'database', 
+    'query', 'bug', 'fix', 'implement', 'deploy', 'test', 'error', 'debug',
+    'pull request', 'commit', 'merge', 'branch', 'review', 'algorithm',
+    'optimize', 'refactor', 'module', 'component', 'feature', 'schema',
+    'migration', 'authentication', 'authorization', 'frontend', 'backend',
+    'server', 'client', 'framework', 'library', 'package', 'dependency',
+    'build', 'compile', 'run', 'execute', 'configuration', 'setup'
+]
+
+# Problem-solving indicators
+PROBLEM_SOLVING_KEYWORDS = [
+    'issue', 'problem', 'solution', 'fix', 'resolve', 'debug', 'error',
+    'crash', 'fail', 'work', 'broken', 'stuck', 'help', 'solve'
+]
+
+# Helping indicators
+HELPING_PHRASES = [
+    "i'll help", "let me", "i can", "sure", "i'll review", "i'll check",
+    "i'll fix", "i'll do", "i've done", "completed", "finished", "ready"
+]
+
+# Question indicators (matched at the start of the message)
+QUESTION_WORDS = ('how', 'what', 'why', 'when', 'where', 'which', 'can', 'should', 'could')
+
+# Keywords that mark a message as a key discussion in the weekly report
+IMPORTANT_KEYWORDS = [
+    'complete', 'finish', 'implement', 'deploy', 'ready', 'done', 
+    'issue', 'problem', 'solution', 'merged', 'pushed', 'reviewed',
+    'blocked', 'stuck', 'error', 'working on', 'started'
+]
+
+# Indicators used by training to collect example messages for each pattern type
+TRAINING_INDICATORS = {
+    'task_completion': ['completed', 'finished', 'done', 'merged', 'deployed', 'ready'],
+    'blockers': ['blocked', 'stuck', 'issue', 'problem', 'error', 'crash', 'fail'],
+    'progress_updates': ['working on', 'started', 'in progress', 'update', 'pushed'],
+    'collaboration': ['help', 'review', 'check', 'thanks', 'lgtm', 'looks good']
 }
 
-def load_synthetic_data(csv_path: str = "synthetic_chats.csv") -> List[ChatMessage]:
+class KeywordMatcher:
     """
-    Load synthetic chat data from CSV file for training.
-    Returns list of ChatMessage objects.
+    Finds every keyword of every category in a single pass over the text.
+    
+    All keywords are compiled into one regex of lookaheads, longest first,
+    so each position reports the longest keyword starting there. Every other
+    keyword starting at that position is a prefix of it, so those are added
+    from a precomputed table. The result is exactly the set of keywords for
+    which `keyword in text` is true.
+    """
+    
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.keyword_categories = defaultdict(set)
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                self.keyword_categories[keyword].add(category)
+        
+        keywords = sorted(self.keyword_categories, key=len, reverse=True)
+        self.prefixes = {
+            keyword: [other for other in keywords if keyword.startswith(other)]
+            for keyword in keywords
+        }
+        self.pattern = re.compile(
+            "(?=(" + "|".join(re.escape(keyword) for keyword in keywords) + "))"
+        ) if keywords else None
+    
+    def to_tables(self) -> Dict:
+        """
+        Export the compiled tables as plain data for the model artifact.
+        """
+        return {
+            'keyword_categories': {kw: sorted(cats) for kw, cats in self.keyword_categories.items()},
+            'prefixes': self.prefixes,
+            'pattern': self.pattern.pattern if self.pattern is not None else None
+        }
+    
+    @classmethod
+    def from_tables(cls, tables: Dict) -> 'KeywordMatcher':
+        """
+        Rebuild a matcher from to_tables() output without recomputing the tables.
+        """
+        matcher = cls.__new__(cls)
+        matcher.keyword_categories = defaultdict(set, {
+            kw: set(cats) for kw, cats in tables['keyword_categories'].items()
+        })
+        matcher.prefixes = tables['prefixes']
+        matcher.pattern = re.compile(tables['pattern']) if tables['pattern'] is not None else None
+        return matcher
+    
+    def find(self, text_lower: str) -> set:
+        """
+        Return every known keyword that occurs in the (lowercased) text.
+        """
+        found = set()
+        if self.pattern is None:
+            return found
+        
+        for match in self.pattern.finditer(text_lower):
+            found.update(self.prefixes[match.group(1)])
+        
+        return found
+    
+    def categories(self, found: set) -> set:
+        """
+        Return the categories hit by a set of keywords from find().
+        """
+        hit = set()
+        for keyword in found:
+            hit |= self.keyword_categories[keyword]
+        return hit
+
+def build_keyword_matcher(trained_patterns: Dict[str, List[str]]) -> KeywordMatcher:
+    """
+    Compile the static keyword tables plus the trigger words of the trained
+    patterns (the first three words of each pattern, deduplicated).
+    """
+    categories = {
+        'technical': TECHNICAL_KEYWORDS,
+        'problem_solving': PROBLEM_SOLVING_KEYWORDS,
+        'helping': HELPING_PHRASES,
+        'important': IMPORTANT_KEYWORDS
+    }
+    
+    for pattern_type, keywords in TRAINING_INDICATORS.items():
+        categories[f'indicator:{pattern_type}'] = keywords
+    
+    for pattern_type, patterns in trained_patterns.items():
+        triggers = set()
+        for pattern in patterns:
+            triggers.update(pattern.split()[:3])
+        categories[f'trained:{pattern_type}'] = sorted(triggers)
+    
+    return KeywordMatcher(categories)
+
+# --- Analysis Modes ---
+# /analyze and /weekly_report take ?mode= to choose how much NLP to pay for:
+#   fast      regex tokens looked up in the model's LemmaTable; spaCy is never run
+#   standard  spaCy tagger and lemmatizer only; topics are noun phrases read
+#             off the part-of-speech tags
+#   deep      adds the dependency parser for noun chunks, and the summarizer
+#             (SUMMARIZER_MODEL) for /analyze
+# Sentiment, classification and word counts are the same in every mode; only
+# keywords, topics and the /analyze summary differ. evaluate_modes.py
+# measures each mode's throughput and agreement with deep.
+ANALYSIS_MODES = ('fast', 'standard', 'deep')
+DEFAULT_ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "deep")
+if DEFAULT_ANALYSIS_MODE not in ANALYSIS_MODES:
+    # Fail at startup rather than answer every request without ?mode= with a 422
+    raise ValueError(f"ANALYSIS_MODE must be one of {', '.join(ANALYSIS_MODES)}, not '{DEFAULT_ANALYSIS_MODE}'")
+
+# Parts of speech that make up a noun phrase, and those that can end one
+PHRASE_POS = frozenset({'DET', 'PRON', 'ADJ', 'NUM', 'NOUN', 'PROPN'})
+PHRASE_HEAD_POS = frozenset({'NOUN', 'PROPN', 'PRON'})
+
+# Tokens split the way spaCy's English tokenizer splits words and
+# contractions: "don't" -> "do" "n't", "team's" -> "team" "'s"
+WORD_PATTERN = re.compile(r"\w+(?=n't\b)|n't\b|'\w+|\w+", re.IGNORECASE)
+
+def spacy_keywords(docs) -> List[str]:
+    """
+    Keywords of parsed docs: lowercase lemmas of tokens that aren't stop
+    words or punctuation and are alphabetical.
+    """
+    return [
+        token.lemma_.lower()
+        for doc in docs
+        for token in doc
+        if not token.is_stop and not token.is_punct and token.is_alpha
+    ]
+
+def tagged_noun_chunks(text: str, tokens) -> List[str]:
+    """
+    Approximate noun chunks from part-of-speech tags alone: runs of
+    adjacent determiners, pronouns, adjectives, numbers and nouns, cut
+    after their last noun or pronoun. A determiner or pronoun starts a new
+    phrase, and anything but whitespace between two tokens ends one.
+    tokens are (start, end, pos) character spans of the text.
+    """
+    chunks = []
+    phrase = []
+    previous_end = None
+    for start, end, pos in chain(tokens, [(None, None, None)]):
+        adjacent = previous_end is not None and start is not None and not text[previous_end:start].strip()
+        if not (pos in PHRASE_POS and adjacent and pos not in ('DET', 'PRON')):
+            heads = [index for index, (_, _, tag) in enumerate(phrase) if tag in PHRASE_HEAD_POS]
+            if heads:
+                chunks.append(text[phrase[0][0]:phrase[heads[-1]][1]])
+            phrase = []
+        if pos in PHRASE_POS:
+            phrase.append((start, end, pos))
+        previous_end = end
+    return chunks
+
+class LemmaTable:
+    """
+    Lemma and part of speech of each lowercased word seen in the tagged
+    training sample, plus spaCy's stop words: enough to find keywords and
+    noun phrases without running spaCy (the fast mode). Unknown words are
+    their own lemma and have no part of speech.
+    """
+    
+    def __init__(self, entries: Optional[Dict[str, tuple]] = None, stop_words=()):
+        self.entries = entries or {}
+        self.stop_words = frozenset(stop_words)
+    
+    def to_tables(self) -> Dict:
+        return {'entries': self.entries, 'stop_words': sorted(self.stop_words)}
+    
+    @classmethod
+    def from_tables(cls, tables: Dict) -> 'LemmaTable':
+        return cls(tables['entries'], tables['stop_words'])
+    
+    def keywords(self, text: str) -> List[str]:
+        """
+        Same filter as spacy_keywords(), with lemmas from the table.
+        """
+        keywords = []
+        for match in WORD_PATTERN.finditer(text):
+            word = match.group().lower()
+            if word.isalpha() and word not in self.stop_words:
+                entry = self.entries.get(word)
+                keywords.append(entry[0] if entry else word)
+        return keywords
+    
+    def noun_chunks(self, text: str) -> List[str]:
+        tokens = []
+        for match in WORD_PATTERN.finditer(text):
+            entry = self.entries.get(match.group().lower())
+            tokens.append((match.start(), match.end(), entry[1] if entry else None))
+        return tagged_noun_chunks(text, tokens)
+
+# --- Trained Model Snapshots ---
+
+class ModelSnapshot(NamedTuple):
+    """
+    One trained model: the learned patterns, the training statistics and the
+    keyword matcher compiled from them. Snapshots are never modified after
+    they are built. Retraining builds a new snapshot and swaps it in, so a
+    request keeps using the snapshot it started with.
+    """
+    version: Optional[str]
+    created_at: Optional[str]
+    source: Optional[str]  # "artifact" or "training"
+    trained_patterns: Dict[str, List[str]]
+    training_stats: Dict
+    keyword_matcher: KeywordMatcher
+    lemma_table: LemmaTable  # for the fast analysis mode
+
+def build_model_snapshot(trained_patterns: Dict[str, List[str]], training_stats: Dict,
+                         source: Optional[str] = None,
+                         lemma_table: Optional[LemmaTable] = None) -> ModelSnapshot:
+    """
+    Build a snapshot from trained patterns and statistics, compiling its matcher.
+    """
+    return ModelSnapshot(
+        version=compute_model_version(trained_patterns, training_stats, lemma_table) if source else None,
+        created_at=datetime.utcnow().isoformat() + 'Z' if source else None,
+        source=source,
+        trained_patterns=trained_patterns,
+        training_stats=training_stats,
+        keyword_matcher=build_keyword_matcher(trained_patterns),
+        lemma_table=lemma_table or LemmaTable()
+    )
+
+def compute_model_version(trained_patterns: Dict, training_stats: Dict,
+                          lemma_table: Optional[LemmaTable] = None) -> str:
+    """
+    Content hash of a trained model, so identical training gives the same version.
+    The lemma table is included: fast-mode results are cached by version.
+    """
+    digest = hashlib.sha256(repr((sorted(trained_patterns.items()), sorted(training_stats.items()))).encode('utf-8'))
+    if lemma_table is not None:
+        digest.update(repr((sorted(lemma_table.entries.items()), sorted(lemma_table.stop_words))).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+# Untrained model used until the artifact is loaded or training finishes
+_current_model = build_model_snapshot(
+    trained_patterns={
+        'task_completion': [],
+        'blockers': [],
+        'progress_updates': [],
+        'collaboration': []
+    },
+    training_stats={
+        'total_messages': 0,
+        'avg_message_length': 0,
+        'common_patterns': {},
+        'user_activity_distribution': {}
+    }
+)
+
+MODEL_SWAP_LOCK = threading.Lock()
+
+def current_model() -> ModelSnapshot:
+    """
+    Return the model snapshot in use. Callers should fetch it once per request
+    and pass it down, so the whole request sees one consistent model.
+    """
+    return _current_model
+
+def install_model(model: ModelSnapshot):
+    """
+    Atomically make a snapshot the current model.
+    """
+    global _current_model
+    with MODEL_SWAP_LOCK:
+        _current_model = model
+    
+    # Cached classifications and responses are keyed by model version; drop the old ones
+    ANALYSIS_CACHE.clear()
+    RESPONSE_CACHE.clear()
+
+# Trained model artifact written by train_model.py and loaded at startup
+MODEL_ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", str(Path(__file__).parent / "model_artifact.pkl"))
+
+# Bump when the artifact layout changes; older artifacts are then retrained
+ARTIFACT_FORMAT_VERSION = 3
+
+def save_model_artifact(model: ModelSnapshot, path: str = MODEL_ARTIFACT_PATH):
+    """
+    Write the trained patterns, training statistics and compiled matcher to a
+    versioned artifact file. The file is written to a temporary name first and
+    then renamed, so a crash never leaves a half-written artifact behind.
+    """
+    artifact = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_version': model.version,
+        'created_at': model.created_at,
+        'trained_patterns': model.trained_patterns,
+        'training_stats': model.training_stats,
+        'keyword_matcher': model.keyword_matcher.to_tables(),
+        'lemma_table': model.lemma_table.to_tables()
+    }
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    
+    print(f"💾 Saved model artifact {model.version} to {path}")
+
+def load_model_artifact(path: str = MODEL_ARTIFACT_PATH) -> Optional[ModelSnapshot]:
+    """
+    Load a model artifact written by save_model_artifact().
+    Returns None if the file is missing, unreadable or from another format version.
+    """
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except Exception as e:
+        print(f"Error loading model artifact: {e}")
+        return None
+    
+    if artifact.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        print(f"⚠️  Model artifact format {artifact.get('format_version')} is outdated (expected {ARTIFACT_FORMAT_VERSION})")
+        return None
+    
+    print(f"✅ Loaded model artifact {artifact['model_version']} from {path}")
+    
+    return ModelSnapshot(
+        version=artifact['model_version'],
+        created_at=artifact['created_at'],
+        source='artifact',
+        trained_patterns=artifact['trained_patterns'],
+        training_stats=artifact['training_stats'],
+        keyword_matcher=KeywordMatcher.from_tables(artifact['keyword_matcher']),
+        lemma_table=LemmaTable.from_tables(artifact['lemma_table'])
+    )
+
+def save_model_artifact_safely(model: ModelSnapshot):
+    """
+    Save the artifact, logging instead of failing when the path isn't writable.
+    """
+    try:
+        save_model_artifact(model)
+    except OSError as e:
+        print(f"Warning: could not save model artifact: {e}")
+
+def load_or_train_model():
+    """
+    Load the persisted model artifact, training (and saving) a new one only
+    when no usable artifact exists.
+    """
+    model = load_model_artifact()
+    if model is not None:
+        install_model(model)
+        return
+    
+    print("⚠️  No usable model artifact, training from scratch")
+    model = train_on_synthetic_data()
+    
+    if model is not None:
+        save_model_artifact_safely(model)
+
+# Streaming settings for training (override with environment variables)
+TRAINING_CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "5000"))
+# Rows used for keyword statistics and pattern extraction; 0 means the whole corpus
+TRAINING_KEYWORD_SAMPLE = int(os.getenv("TRAINING_KEYWORD_SAMPLE", "1000"))
+TRAINING_PATTERN_SAMPLE = int(os.getenv("TRAINING_PATTERN_SAMPLE", "500"))
+
+# Example messages kept per pattern type
+PATTERNS_PER_TYPE = 50
+
+# --- Binary Training Corpus ---
+# The training CSV is converted once into a columnar binary file next to it
+# (synthetic_chats.corpus) and read through mmap afterwards: usernames,
+# projects and channels are dictionary-encoded int32 codes, timestamps are
+# int64 microseconds, and all texts are one UTF-8 blob addressed by offsets.
+# The columns are read-only views of the mapping, so nothing is parsed at
+# startup and worker processes share the same page cache. The CSV stays the
+# interchange format: the binary file is rebuilt whenever the CSV is newer.
+TRAINING_CORPUS_BINARY = os.getenv("TRAINING_CORPUS_BINARY", "1") == "1"
+
+CORPUS_MAGIC = b"CHATCORP"
+# Bump when the layout changes; older files are then rebuilt
+CORPUS_FORMAT_VERSION = 1
+CORPUS_PREAMBLE = struct.Struct("<8sII")  # magic, format version, header length
+
+def training_corpus_path(csv_file: Path) -> Path:
+    return csv_file.with_suffix('.corpus')
+
+def training_csv_column(header: List[str], name: str) -> int:
+    """
+    Index of a required column of the training CSV; KeyError if it is missing.
+    """
+    if name not in header:
+        raise KeyError(f"Training CSV has no '{name}' column")
+    return header.index(name)
+
+def check_training_row(reader, row: List[str], width: int):
+    """
+    Raise csv.Error for a row too short to hold every column that is read.
+    """
+    if len(row) < width:
+        raise csv.Error(f"Training CSV line {reader.line_num} has {len(row)} fields, expected at least {width}")
+
+def convert_training_csv(csv_file: Path, corpus_file: Path) -> int:
+    """
+    Convert a training CSV to the binary corpus format and return the row count.
+    Texts are spooled to a temporary file while the CSV is read, so only the
+    code and offset columns are held in memory. The result replaces
+    corpus_file atomically.
+    """
+    dictionaries = {'usernames': {}, 'projects': {}, 'channels': {}}
+    codes = {name: array('i') for name in dictionaries}
+    timestamps = array('q')
+    text_offsets = array('q', [0])
+    tmp_path = corpus_file.with_name(f"{corpus_file.name}.{os.getpid()}.tmp")
+    blob_path = corpus_file.with_name(f"{corpus_file.name}.{os.getpid()}.blob")
+    
+    try:
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f, open(blob_path, 'wb') as blob:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            username_col = training_csv_column(header, 'sender_username')
+            text_col = training_csv_column(header, 'text')
+            columns = {
+                'usernames': username_col,
+                'projects': header.index('project_id') if 'project_id' in header else None,
+                'channels': header.index('channel') if 'channel' in header else None
+            }
+            timestamp_col = header.index('timestamp') if 'timestamp' in header else None
+            width = 1 + max(col for col in (*columns.values(), text_col, timestamp_col) if col is not None)
+            
+            written = 0
+            for row in reader:
+                check_training_row(reader, row, width)
+                for name, col in columns.items():
+                    value = row[col] if col is not None else ""
+                    codes[name].append(dictionaries[name].setdefault(value, len(dictionaries[name])))
+                timestamps.append(timestamp_micros(row[timestamp_col] if timestamp_col is not None else None))
+                written += blob.write(row[text_col].encode('utf-8'))
+                text_offsets.append(written)
+        
+        rows = len(timestamps)
+        # Column layout: name -> (byte offset from the data start, dtype, count)
+        arrays = [
+            ('user_codes', codes['usernames']), ('project_codes', codes['projects']),
+            ('channel_codes', codes['channels']), ('timestamps', timestamps), ('text_offsets', text_offsets)
+        ]
+        layout = {}
+        position = 0
+        for name, values in arrays:
+            layout[name] = [position, '<i4' if values.typecode == 'i' else '<i8', len(values)]
+            position += -(-len(values) * values.itemsize // 8) * 8
+        layout['text'] = [position, '|u1', written]
+        
+        header_bytes = json.dumps({
+            'rows': rows,
+            'dictionaries': {name: list(values) for name, values in dictionaries.items()},
+            'columns': layout,
+            'source': csv_file.name
+        }).encode('utf-8')
+        header_bytes += b" " * (-(CORPUS_PREAMBLE.size + len(header_bytes)) % 8)
+        
+        with open(tmp_path, 'wb') as out:
+            out.write(CORPUS_PREAMBLE.pack(CORPUS_MAGIC, CORPUS_FORMAT_VERSION, len(header_bytes)))
+            out.write(header_bytes)
+            for name, values in arrays:
+                data = np.asarray(values).astype(layout[name][1], copy=False).tobytes()
+                out.write(data + b"\0" * (-len(data) % 8))
+            with open(blob_path, 'rb') as blob:
+                shutil.copyfileobj(blob, out)
+        os.replace(tmp_path, corpus_file)
+    finally:
+        for path in (tmp_path, blob_path):
+            if path.exists():
+                path.unlink()
+    
+    print(f"✅ Converted {rows} rows from {csv_file.name} to {corpus_file.name}")
+    return rows
+
+class TrainingCorpus:
+    """
+    Read-only, memory-mapped view of a binary training corpus.
+    """
+    
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, header_length = CORPUS_PREAMBLE.unpack_from(self.mapping, 0)
+        if magic != CORPUS_MAGIC or version != CORPUS_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {CORPUS_FORMAT_VERSION} training corpus")
+        header = json.loads(self.mapping[CORPUS_PREAMBLE.size:CORPUS_PREAMBLE.size + header_length])
+        data_start = CORPUS_PREAMBLE.size + header_length
+        
+        self.rows = header['rows']
+        self.usernames = header['dictionaries']['usernames']
+        self.projects = header['dictionaries']['projects']
+        self.channels = header['dictionaries']['channels']
+        columns = {
+            name: np.frombuffer(self.mapping, dtype=dtype, count=count, offset=data_start + offset)
+            for name, (offset, dtype, count) in header['columns'].items()
+        }
+        self.user_codes = columns['user_codes']
+        self.project_codes = columns['project_codes']
+        self.channel_codes = columns['channel_codes']
+        self.timestamps = columns['timestamps']
+        self.text_offsets = columns['text_offsets']
+        self.text_start = data_start + header['columns']['text'][0]
+    
+    def __len__(self) -> int:
+        return self.rows
+    
+    def text(self, index: int) -> str:
+        start, end = self.text_offsets[index:index + 2].tolist()
+        return self.mapping[self.text_start + start:self.text_start + end].decode('utf-8')
+    
+    def iter_chunks(self, chunk_size: int = TRAINING_CHUNK_SIZE):
+        """
+        (username, text, timestamp) tuples in chunks, like iter_training_rows().
+        Each chunk's texts are read from the mapping in one slice; when that
+        slice is ASCII the byte offsets are also string offsets.
+        """
+        for start in range(0, self.rows, chunk_size):
+            stop = min(start + chunk_size, self.rows)
+            offsets = self.text_offsets[start:stop + 1]
+            blob = self.mapping[self.text_start + offsets[0]:self.text_start + offsets[-1]]
+            bounds = (offsets - offsets[0]).tolist()
+            if blob.isascii():
+                text = blob.decode('ascii')
+                texts = [text[begin:end] for begin, end in zip(bounds, bounds[1:])]
+            else:
+                texts = [blob[begin:end].decode('utf-8') for begin, end in zip(bounds, bounds[1:])]
+            
+            timestamps = self.timestamps[start:stop]
+            formatted = np.datetime_as_string(timestamps.astype('datetime64[us]'), unit='us').tolist()
+            missing = (timestamps == MISSING_TIMESTAMP).tolist()
+            
+            yield [
+                (self.usernames[user], text, None if absent else stamp + 'Z')
+                for user, text, stamp, absent in zip(self.user_codes[start:stop].tolist(), texts, formatted, missing)
+            ]
+
+def open_training_corpus(csv_file: Path) -> Optional[TrainingCorpus]:
+    """
+    The binary corpus for csv_file, (re)built first if it is missing, stale
+    or from an older format. None (read the CSV instead) if that fails.
+    """
+    corpus_file = training_corpus_path(csv_file)
+    try:
+        if not corpus_file.exists() or corpus_file.stat().st_mtime_ns < csv_file.stat().st_mtime_ns:
+            convert_training_csv(csv_file, corpus_file)
+        try:
+            return TrainingCorpus(corpus_file)
+        except ValueError:
+            convert_training_csv(csv_file, corpus_file)
+            return TrainingCorpus(corpus_file)
+    except (OSError, ValueError, KeyError, csv.Error) as e:
+        print(f"⚠️  Binary training corpus unavailable, reading the CSV: {e}")
+        return None
+
+def iter_training_rows(csv_path: str = "synthetic_chats.csv", chunk_size: int = TRAINING_CHUNK_SIZE):
+    """
+    Stream the training CSV in chunks of (username, text, timestamp) tuples.
+    Training input is trusted, so rows skip pydantic validation, and only one
+    chunk is held in memory at a time. Rows come from the memory-mapped
+    binary corpus (converted from the CSV when needed) unless
+    TRAINING_CORPUS_BINARY=0.
     """
-    messages = []
     csv_file = Path(__file__).parent / csv_path
     
     if not csv_file.exists():
         print(f"Warning: CSV file not found at {csv_file}")
-        return messages
+        return
+    
+    corpus = open_training_corpus(csv_file) if TRAINING_CORPUS_BINARY else None
+    if corpus is not None:
+        yield from corpus.iter_chunks(chunk_size)
+        return
+    
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        
+        username_col = training_csv_column(header, 'sender_username')
+        text_col = training_csv_column(header, 'text')
+        timestamp_col = header.index('timestamp') if 'timestamp' in header else None
+        width = 1 + max(col for col in (username_col, text_col, timestamp_col) if col is not None)
+        
+        chunk = []
+        for row in reader:
+            check_training_row(reader, row, width)
+            chunk.append((
+                row[username_col],
+                row[text_col],
+                row[timestamp_col] if timestamp_col is not None else None
+            ))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        
+        if chunk:
+            yield chunk
+
+def load_synthetic_data(csv_path: str = "synthetic_chats.csv") -> List[ChatMessage]:
+    """
+    Load synthetic chat data from CSV file for training.
+    Returns list of ChatMessage objects.
+    Training itself streams the file with iter_training_rows() instead.
+    """
+    messages = []
     
     try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                messages.append(ChatMessage(
-                    username=row['sender_username'],
-                    text=row['text'],
-                    timestamp=row.get('timestamp')
-                ))
+        for chunk in iter_training_rows(csv_path):
+            for username, text, timestamp in chunk:
+                messages.append(ChatMessage(username=username, text=text, timestamp=timestamp))
         print(f"✅ Loaded {len(messages)} messages from {csv_path}")
-    except Exception as e:
+    except (OSError, UnicodeDecodeError, csv.Error, KeyError) as e:
         print(f"Error loading CSV: {e}")
     
     return messages
 
-def train_on_synthetic_data():
+def train_model_snapshot(csv_path: str = "synthetic_chats.csv", progress=None) -> Optional[ModelSnapshot]:
     """
-    Train pattern recognition on synthetic data.
+    Train pattern recognition on synthetic data and return a new model snapshot.
     Identifies common patterns for task completion, blockers, progress updates, etc.
+    The CSV is streamed chunk by chunk and every statistic is updated
+    incrementally, so memory stays constant however large the corpus is.
+    The current model is not touched; progress(rows_done) is called after each chunk.
     """
-    global TRAINED_PATTERNS, TRAINING_STATS
-    
     print("🎓 Training on synthetic data...")
-    messages = load_synthetic_data()
+    started = time.perf_counter()
     
-    if not messages:
-        print("⚠️  No training data available")
-        return
+    # The indicator tables are static, so any model's matcher can find them
+    matcher = current_model().keyword_matcher
     
-    # Update training stats
-    TRAINING_STATS['total_messages'] = len(messages)
-    word_counts = [len(msg.text.split()) for msg in messages]
-    TRAINING_STATS['avg_message_length'] = sum(word_counts) / len(word_counts)
+    total_messages = 0
+    total_words = 0
+    keyword_counts = TopKSketch()
+    lemma_counts = defaultdict(Counter)  # word -> (lemma, pos) counts, for the lemma table
+    user_message_counts = Counter()
+    patterns = {pattern_type: [] for pattern_type in TRAINING_INDICATORS}
     
-    # Extract patterns using NLP
-    task_completion_patterns = []
-    blocker_patterns = []
-    progress_patterns = []
-    collaboration_patterns = []
+    try:
+        for chunk in iter_training_rows(csv_path):
+            chunk_start = total_messages
+            
+            for username, text, _ in chunk:
+                total_words += len(text.split())
+                user_message_counts[username] += 1
+            total_messages += len(chunk)
+            
+            # Common technical terms distribution (the sampled part of this chunk)
+            keyword_rows = chunk if not TRAINING_KEYWORD_SAMPLE else chunk[:max(0, TRAINING_KEYWORD_SAMPLE - chunk_start)]
+            if keyword_rows:
+                doc = next(parse_texts([" ".join(text for _, text, _ in keyword_rows)], 'keywords'))
+                keyword_counts.update(spacy_keywords([doc]))
+                for token in doc:
+                    if token.is_alpha:
+                        lemma_counts[token.lower_][(token.lemma_.lower(), token.pos_)] += 1
+            
+            # Extract common patterns
+            pattern_rows = chunk if not TRAINING_PATTERN_SAMPLE else chunk[:max(0, TRAINING_PATTERN_SAMPLE - chunk_start)]
+            for _, text, _ in pattern_rows:
+                text_lower = text.lower()
+                indicators = matcher.categories(matcher.find(text_lower))
+                
+                # Task completion, blocker, progress and collaboration indicators
+                for pattern_type, examples in patterns.items():
+                    if f'indicator:{pattern_type}' in indicators and len(examples) < PATTERNS_PER_TYPE:
+                        examples.append(text_lower)
+            
+            if progress is not None:
+                progress(total_messages)
+    except (OSError, UnicodeDecodeError, csv.Error, KeyError) as e:
+        # Only an unreadable training file is reported here; errors in the
+        # NLP pipeline or the model code propagate to the caller
+        print(f"Error loading CSV: {e}")
+        return None
     
-    # Common technical terms distribution
-    all_text = " ".join([msg.text for msg in messages[:1000]])  # Sample for performance
-    doc = nlp(all_text)
+    if not total_messages:
+        print("⚠️  No training data available")
+        return None
     
-    # Extract common patterns
-    for msg in messages[:500]:  # Sample for training
-        text_lower = msg.text.lower()
-        
-        # Task completion indicators
-        if any(word in text_lower for word in ['completed', 'finished', 'done', 'merged', 'deployed', 'ready']):
-            task_completion_patterns.append(text_lower)
-        
-        # Blocker indicators
-        if any(word in text_lower for word in ['blocked', 'stuck', 'issue', 'problem', 'error', 'crash', 'fail']):
-            blocker_patterns.append(text_lower)
-        
-        # Progress indicators
-        if any(word in text_lower for word in ['working on', 'started', 'in progress', 'update', 'pushed']):
-            progress_patterns.append(text_lower)
-        
-        # Collaboration indicators
-        if any(word in text_lower for word in ['help', 'review', 'check', 'thanks', 'lgtm', 'looks good']):
-            collaboration_patterns.append(text_lower)
+    print(f"✅ Streamed {total_messages} messages from {csv_path}")
     
-    # Store patterns
-    TRAINED_PATTERNS['task_completion'] = task_completion_patterns[:50]
-    TRAINED_PATTERNS['blockers'] = blocker_patterns[:50]
-    TRAINED_PATTERNS['progress_updates'] = progress_patterns[:50]
-    TRAINED_PATTERNS['collaboration'] = collaboration_patterns[:50]
+    training_stats = {
+        'total_messages': total_messages,
+        'avg_message_length': total_words / total_messages,
+        'common_patterns': dict(keyword_counts.most_common(30)),
+        'user_activity_distribution': dict(user_message_counts.most_common(20))
+    }
     
-    # Extract common keywords
-    keywords = [token.lemma_.lower() for token in doc if not token.is_stop and not token.is_punct and token.is_alpha]
-    TRAINING_STATS['common_patterns'] = dict(Counter(keywords).most_common(30))
+    # Each word's most frequent lemma and part of speech
+    lemma_table = LemmaTable(
+        {word: counts.most_common(1)[0][0] for word, counts in lemma_counts.items()},
+        get_nlp().Defaults.stop_words
+    )
     
-    # User activity distribution
-    user_message_counts = Counter([msg.username for msg in messages])
-    TRAINING_STATS['user_activity_distribution'] = dict(user_message_counts.most_common(20))
+    model = build_model_snapshot(patterns, training_stats, source='training', lemma_table=lemma_table)
+    TRAINING_DURATION.observe(time.perf_counter() - started)
     
     print(f"✅ Training complete!")
-    print(f"   - Task completion patterns: {len(TRAINED_PATTERNS['task_completion'])}")
-    print(f"   - Blocker patterns: {len(TRAINED_PATTERNS['blockers'])}")
-    print(f"   - Progress patterns: {len(TRAINED_PATTERNS['progress_updates'])}")
-    print(f"   - Collaboration patterns: {len(TRAINED_PATTERNS['collaboration'])}")
-    print(f"   - Common keywords tracked: {len(TRAINING_STATS['common_patterns'])}")
+    print(f"   - Task completion patterns: {len(patterns['task_completion'])}")
+    print(f"   - Blocker patterns: {len(patterns['blockers'])}")
+    print(f"   - Progress patterns: {len(patterns['progress_updates'])}")
+    print(f"   - Collaboration patterns: {len(patterns['collaboration'])}")
+    print(f"   - Common keywords tracked: {len(training_stats['common_patterns'])}")
+    print(f"   - Lemma table words: {len(lemma_table.entries)}")
+    print(f"   - Model version: {model.version}")
+    
+    return model
+
+def train_on_synthetic_data(csv_path: str = "synthetic_chats.csv") -> Optional[ModelSnapshot]:
+    """
+    Train on synthetic data and install the result as the current model.
+    """
+    model = train_model_snapshot(csv_path)
+    if model is not None:
+        install_model(model)
+    return model
 
-def enhanced_message_classification(text: str, doc) -> Dict:
+def enhanced_message_classification(text: str, doc=None, found: Optional[set] = None,
+                                    model: Optional[ModelSnapshot] = None) -> Dict:
     """
     Enhanced classification using trained patterns.
+    Pass the keywords from the model's keyword_matcher.find() to reuse an existing scan.
     """
-    text_lower = text.lower()
-    
-    # Use trained patterns for better classification
-    task_completion_score = sum(1 for pattern in TRAINED_PATTERNS['task_completion'] 
-                                if any(word in text_lower for word in pattern.split()[:3]))
-    
-    blocker_score = sum(1 for pattern in TRAINED_PATTERNS['blockers'] 
-                       if any(word in text_lower for word in pattern.split()[:3]))
-    
-    progress_score = sum(1 for pattern in TRAINED_PATTERNS['progress_updates'] 
-                        if any(word in text_lower for word in pattern.split()[:3]))
-    
-    collaboration_score = sum(1 for pattern in TRAINED_PATTERNS['collaboration'] 
-                             if any(word in text_lower for word in pattern.split()[:3]))
+    matcher = (model or current_model()).keyword_matcher
+    if found is None:
+        found = matcher.find(text.lower())
     
     # Original classification
-    base_classification = classify_message_type(text, doc)
+    base_classification = classify_message_type(text, doc, found, model)
     
-    # Enhanced with training
-    base_classification['task_completed'] = task_completion_score > 0
-    base_classification['has_blocker'] = blocker_score > 0
-    base_classification['progress_update'] = progress_score > 0
-    base_classification['collaboration'] = collaboration_score > 0
+    # Enhanced with training: any trigger word of any trained pattern counts
+    categories = matcher.categories(found)
+    base_classification['task_completed'] = 'trained:task_completion' in categories
+    base_classification['has_blocker'] = 'trained:blockers' in categories
+    base_classification['progress_update'] = 'trained:progress_updates' in categories
+    base_classification['collaboration'] = 'trained:collaboration' in categories
     
     return base_classification
 
 # --- Helper Functions for Advanced Analysis ---
 
-def classify_message_type(text: str, doc) -> Dict[str, bool]:
+def classify_message_type(text: str, doc=None, found: Optional[set] = None,
+                          model: Optional[ModelSnapshot] = None) -> Dict[str, bool]:
     """
-    Classify message type using NLP analysis.
+    Classify message type using keyword analysis.
     Returns dict with boolean flags for different message types.
+    The doc argument is unused, so callers don't need to parse the text first.
     """
     text_lower = text.lower()
+    matcher = (model or current_model()).keyword_matcher
     
-    # Technical keywords indicating actual work
-    technical_keywords = [
-        'code', 'function', 'class', 'method', 'api', 'endpoint', 'database', 
-        'query', 'bug', 'fix', 'implement', 'deploy', 'test', 'error', 'debug',
-        'pull request', 'commit', 'merge', 'branch', 'review', 'algorithm',
-        'optimize', 'refactor', 'module', 'component', 'feature', 'schema',
-        'migration', 'authentication', 'authorization', 'frontend', 'backend',
-        'server', 'client', 'framework', 'library', 'package', 'dependency',
-        'build', 'compile', 'run', 'execute', 'configuration', 'setup'
-    ]
-    
-    # Problem-solving indicators
-    problem_solving = [
-        'issue', 'problem', 'solution', 'fix', 'resolve', 'debug', 'error',
-        'crash', 'fail', 'work', 'broken', 'stuck', 'help', 'solve'
-    ]
-    
-    # Helping indicators
-    helping_phrases = [
-        "i'll help", "let me", "i can", "sure", "i'll review", "i'll check",
-        "i'll fix", "i'll do", "i've done", "completed", "finished", "ready"
-    ]
-    
-    # Question indicators
-    question_words = ['how', 'what', 'why', 'when', 'where', 'which', 'can', 'should', 'could']
+    if found is None:
+        found = matcher.find(text_lower)
+    categories = matcher.categories(found)
     
-    is_technical = any(keyword in text_lower for keyword in technical_keywords)
-    is_problem_solving = any(word in text_lower for word in problem_solving)
-    is_helping = any(phrase in text_lower for phrase in helping_phrases)
-    is_question = text.strip().endswith('?') or any(text_lower.startswith(q) for q in question_words)
+    is_technical = 'technical' in categories
+    is_problem_solving = 'problem_solving' in categories
+    is_helping = 'helping' in categories
+    is_question = text.strip().endswith('?') or text_lower.startswith(QUESTION_WORDS)
     
     # Extract technical keywords actually used
-    used_keywords = [kw for kw in technical_keywords if kw in text_lower]
+    used_keywords = [kw for kw in TECHNICAL_KEYWORDS if kw in found] if is_technical else []
     
     return {
         'is_technical': is_technical,
@@ -336,392 +1450,902 @@ def calculate_contribution_quality(metrics: Dict) -> str:
     else:
         return "Low"
 
-def analyze_user_contributions(messages: List[ChatMessage]) -> List[ContributionMetrics]:
+# --- Per-Message Analysis Cache ---
+
+class AnalysisCache:
     """
-    Deeply analyze each user's contributions using NLP and trained patterns.
+    Bounded LRU cache of per-message analysis results.
+    Entries are keyed by a hash of the model version, the analysis mode and
+    the message text, so the same text is only analyzed once per model and
+    mode no matter which request or user it arrives in. The key is the exact
+    text: question detection and noun chunks are case and whitespace
+    sensitive, so folding those away would change the results.
     """
-    user_data = defaultdict(lambda: {
-        'messages': [],
-        'technical_count': 0,
-        'problem_solving_count': 0,
-        'help_given_count': 0,
-        'question_count': 0,
-        'tasks_completed': 0,
-        'blockers_reported': 0,
-        'progress_updates': 0,
-        'word_counts': [],
-        'technical_keywords': set()
-    })
     
-    # Analyze each message with enhanced classification
-    for msg in messages:
-        doc = nlp(msg.text)
-        classification = enhanced_message_classification(msg.text, doc)
-        
-        user_data[msg.username]['messages'].append(msg.text)
-        user_data[msg.username]['word_counts'].append(len(msg.text.split()))
-        
-        if classification['is_technical']:
-            user_data[msg.username]['technical_count'] += 1
-            user_data[msg.username]['technical_keywords'].update(classification['technical_keywords'])
-        
-        if classification['is_problem_solving']:
-            user_data[msg.username]['problem_solving_count'] += 1
-        
-        if classification['is_helping']:
-            user_data[msg.username]['help_given_count'] += 1
-        
-        if classification['is_question']:
-            user_data[msg.username]['question_count'] += 1
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def key(text: str, model_version: Optional[str] = None, mode: str = 'deep') -> bytes:
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16)
+        digest.update((model_version or '').encode('utf-8'))
+        digest.update(b'\0' + mode.encode('utf-8'))
+        return digest.digest()
+    
+    def get(self, key: bytes) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return entry
+    
+    def put(self, key: bytes, entry: Dict):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Shared cache; cleared whenever a new model is installed
+ANALYSIS_CACHE = AnalysisCache(int(os.getenv("ANALYSIS_CACHE_SIZE", "50000")))
+
+def analyze_texts(texts: List[str], with_topics: bool = False, with_keywords: bool = False,
+                  model: Optional[ModelSnapshot] = None, mode: str = 'deep') -> List[Dict]:
+    """
+    Return the analysis of each text, served from ANALYSIS_CACHE when possible.
+    Flags, word count and sentiment are always filled in. Noun chunks and
+    keyword lemmas are only computed (in one batch, for the texts that
+    don't have them cached yet) when asked for, the way the analysis mode
+    says (see ANALYSIS_MODES).
+    """
+    model = model or current_model()
+    matcher = model.keyword_matcher
+    entries = []
+    # Entries still missing noun chunks or keywords, by entry identity: a
+    # repeated text shares one entry unless it was evicted in between, and
+    # then both entries must be filled in
+    pending_topics = {}
+    pending_keywords = {}
+    # Stage times are summed over the cache misses and recorded once per call
+    sentiment_seconds = 0.0
+    classification_seconds = 0.0
+    misses = 0
+    
+    for text in texts:
+        key = AnalysisCache.key(text, model.version, mode)
+        entry = ANALYSIS_CACHE.get(key)
         
-        # Enhanced metrics from training
-        if classification.get('task_completed'):
-            user_data[msg.username]['tasks_completed'] += 1
+        if entry is None:
+            started = time.perf_counter()
+            sentiment = get_sia().polarity_scores(text)['compound']
+            scored = time.perf_counter()
+            found = matcher.find(text.lower())
+            classification = enhanced_message_classification(text, found=found, model=model)
+            is_key_discussion = 'important' in matcher.categories(found)
+            sentiment_seconds += scored - started
+            classification_seconds += time.perf_counter() - scored
+            misses += 1
+            entry = {
+                'word_count': len(text.split()),
+                'sentiment': sentiment,
+                'classification': classification,
+                'is_key_discussion': is_key_discussion,
+                'noun_chunks': None,
+                'keywords': None
+            }
+            ANALYSIS_CACHE.put(key, entry)
         
-        if classification.get('has_blocker'):
-            user_data[msg.username]['blockers_reported'] += 1
+        if with_topics and entry['noun_chunks'] is None:
+            pending_topics[id(entry)] = (text, entry)
+        if with_keywords and entry['keywords'] is None:
+            pending_keywords[id(entry)] = (text, entry)
         
-        if classification.get('progress_update'):
-            user_data[msg.username]['progress_updates'] += 1
+        entries.append(entry)
+    
+    if misses:
+        STAGE_LATENCY.observe(sentiment_seconds, ('sentiment',))
+        STAGE_LATENCY.observe(classification_seconds, ('classification',))
+        profile = ACTIVE_PROFILE.get()
+        if profile is not None:
+            # Interleaved per message, so timed but without allocation peaks
+            profile.stage_finished('sentiment', sentiment_seconds)
+            profile.stage_finished('classification', classification_seconds)
+    
+    if mode == 'fast':
+        if pending_topics or pending_keywords:
+            table = model.lemma_table
+            with stage_timer('lemma_table'):
+                for text, entry in pending_topics.values():
+                    entry['noun_chunks'] = table.noun_chunks(text)
+                for text, entry in pending_keywords.values():
+                    entry['keywords'] = table.keywords(text)
+        return entries
+    
+    if mode == 'standard':
+        # One tagger pass gives both the keywords and the noun phrases
+        pending = list({**pending_topics, **pending_keywords}.values())
+        if pending:
+            with stage_timer('parse_keywords'):
+                for (text, entry), docs in zip(pending, parse_text_pieces([text for text, _ in pending], 'keywords')):
+                    entry['noun_chunks'] = [
+                        chunk
+                        for doc in docs
+                        for chunk in tagged_noun_chunks(doc.text, ((t.idx, t.idx + len(t), t.pos_) for t in doc))
+                    ]
+                    entry['keywords'] = spacy_keywords(docs)
+        return entries
+    
+    if pending_topics:
+        pending = list(pending_topics.values())
+        with stage_timer('parse_topics'):
+            for (text, entry), docs in zip(pending, parse_text_pieces([text for text, _ in pending], 'topics')):
+                entry['noun_chunks'] = [chunk.text for doc in docs for chunk in doc.noun_chunks]
+    
+    if pending_keywords:
+        pending = list(pending_keywords.values())
+        with stage_timer('parse_keywords'):
+            for (text, entry), docs in zip(pending, parse_text_pieces([text for text, _ in pending], 'keywords')):
+                entry['keywords'] = spacy_keywords(docs)
+    
+    return entries
+
+def analyze_messages(messages: List[ChatMessage], with_topics: bool = True,
+                     model: Optional[ModelSnapshot] = None, mode: str = 'deep') -> List[Dict]:
+    """
+    Single analysis pass over the messages.
+    Returns one record per message holding the classification flags, word
+    count, sentiment and noun chunks, so the contribution metrics, weekly
+    counters, topics and key discussions can all be derived without parsing
+    the text again. Classification needs no spaCy parse, so with
+    with_topics=False the texts are never sent through the pipeline.
+    """
+    entries = analyze_texts([msg.text for msg in messages], with_topics=with_topics, model=model, mode=mode)
     
-    # Calculate metrics for each user
-    contributions = []
+    return [
+        dict(entry, username=msg.username, text=msg.text)
+        for msg, entry in zip(messages, entries)
+    ]
+
+# --- Columnar Message Batches ---
+
+# Timestamp stored for messages without a (parseable) timestamp
+MISSING_TIMESTAMP = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Per-user counters that are a plain count of flagged messages
+USER_FLAG_COUNTERS = {
+    'technical_count': 'is_technical',
+    'problem_solving_count': 'is_problem_solving',
+    'help_given_count': 'is_helping',
+    'question_count': 'is_question',
+    'tasks_completed': 'task_completed',
+    'blockers_reported': 'has_blocker',
+    'progress_updates': 'progress_update'
+}
+
+def timestamp_micros(timestamp: Optional[str]) -> int:
+    """
+    ISO timestamp as int64 microseconds since the epoch (UTC), or
+    MISSING_TIMESTAMP when it is absent, can't be parsed or falls outside
+    the datetime range once converted to UTC.
+    """
+    if not timestamp:
+        return MISSING_TIMESTAMP
+    try:
+        return (parse_timestamp(timestamp) - EPOCH) // timedelta(microseconds=1)
+    except (ValueError, OverflowError):
+        return MISSING_TIMESTAMP
+
+class MessageBatch:
+    """
+    Compact columnar form of a list of messages.
+    Usernames are interned to int ids (users[user_id] is the name, in order
+    of first appearance) and timestamps are int64 microseconds since the
+    epoch, or None when the batch was built without them. The texts are the
+    messages' own strings, not copies, so a batch adds only its per-message
+    columns to the messages it was built from.
+    """
     
-    for username, data in user_data.items():
-        total_messages = len(data['messages'])
-        
-        # Enhanced technical contribution score (0-100)
-        technical_ratio = data['technical_count'] / total_messages if total_messages > 0 else 0
-        problem_solving_ratio = data['problem_solving_count'] / total_messages if total_messages > 0 else 0
-        help_ratio = data['help_given_count'] / total_messages if total_messages > 0 else 0
-        completion_ratio = data['tasks_completed'] / total_messages if total_messages > 0 else 0
-        
-        # Weighted score with completion bonus
-        technical_score = (
-            (technical_ratio * 40) +  # 40% weight on technical content
-            (problem_solving_ratio * 25) +  # 25% weight on problem solving
-            (help_ratio * 15) +  # 15% weight on helping others
-            (completion_ratio * 20)  # 20% weight on task completion
-        )
+    def __init__(self, users: List[str], user_ids: np.ndarray, message_texts: List[str],
+                 timestamps: Optional[np.ndarray] = None):
+        self.users = users
+        self.user_ids = user_ids
+        self.message_texts = message_texts
+        self.timestamps = timestamps
+    
+    @classmethod
+    def from_messages(cls, messages: List[ChatMessage], with_timestamps: bool = True) -> 'MessageBatch':
+        user_index = {}
+        user_ids = np.fromiter(
+            (user_index.setdefault(msg.username, len(user_index)) for msg in messages),
+            dtype=np.int32, count=len(messages))
+        timestamps = None
+        if with_timestamps:
+            timestamps = np.fromiter(
+                (timestamp_micros(msg.timestamp) for msg in messages), dtype=np.int64, count=len(messages))
         
-        avg_msg_length = sum(data['word_counts']) / len(data['word_counts']) if data['word_counts'] else 0
-        
-        # Determine if user is an active contributor
-        is_active = (
-            data['tasks_completed'] >= 1 or  # Completed at least 1 task
-            data['technical_count'] >= 2 or  # At least 2 technical messages
-            (technical_ratio >= 0.3 and total_messages >= 3)  # Or 30% technical with 3+ messages
+        return cls(
+            users=list(user_index),
+            user_ids=user_ids,
+            message_texts=[msg.text for msg in messages],
+            timestamps=timestamps
         )
+    
+    def __len__(self) -> int:
+        return len(self.user_ids)
+    
+    def text(self, index: int) -> str:
+        return self.message_texts[index]
+    
+    def texts(self) -> List[str]:
+        return self.message_texts
+    
+    def username(self, index: int) -> str:
+        return self.users[self.user_ids[index]]
+    
+    def count_by_user(self, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Sum of weights (or number of messages) per user id.
+        """
+        return np.bincount(self.user_ids, weights=weights, minlength=len(self.users))
+    
+    def user_counters(self, entries: List[Dict]) -> Dict[str, Dict]:
+        """
+        Per-user contribution counters (as from new_user_counters()) for the
+        analyze_texts() entries of this batch, in order of first appearance.
+        """
+        classifications = [entry['classification'] for entry in entries]
+        columns = {
+            'message_count': self.count_by_user(),
+            'word_total': self.count_by_user(np.fromiter(
+                (entry['word_count'] for entry in entries), dtype=np.float64, count=len(entries)))
+        }
+        for field, flag in USER_FLAG_COUNTERS.items():
+            columns[field] = self.count_by_user(np.fromiter(
+                (bool(c.get(flag)) for c in classifications), dtype=np.float64, count=len(entries)))
+        columns = {field: column.astype(np.int64).tolist() for field, column in columns.items()}
         
-        contribution_quality = calculate_contribution_quality({'technical_score': technical_score})
+        keywords = [{} for _ in self.users]
+        for user_id, classification in zip(self.user_ids.tolist(), classifications):
+            if classification['is_technical']:
+                keywords[user_id].update(dict.fromkeys(classification['technical_keywords']))
+        
+        return {
+            username: dict(
+                {field: column[user_id] for field, column in columns.items()},
+                technical_keywords=keywords[user_id]
+            )
+            for user_id, username in enumerate(self.users)
+        }
+
+def new_user_counters() -> Dict:
+    """
+    Empty per-user contribution counters, filled by add_user_record().
+    """
+    return {
+        'message_count': 0,
+        'word_total': 0,
+        'technical_count': 0,
+        'problem_solving_count': 0,
+        'help_given_count': 0,
+        'question_count': 0,
+        'tasks_completed': 0,
+        'blockers_reported': 0,
+        'progress_updates': 0,
+        # Used as an ordered set (keyword -> None) so merged shards keep first-seen order
+        'technical_keywords': {}
+    }
+
+def add_user_record(user_data: Dict[str, Dict], record: Dict):
+    """
+    Fold one analyze_messages() record into its author's counters.
+    """
+    classification = record['classification']
+    user = user_data.get(record['username'])
+    if user is None:
+        user = user_data[record['username']] = new_user_counters()
+    
+    user['message_count'] += 1
+    user['word_total'] += record['word_count']
+    
+    if classification['is_technical']:
+        user['technical_count'] += 1
+        user['technical_keywords'].update(dict.fromkeys(classification['technical_keywords']))
+    
+    if classification['is_problem_solving']:
+        user['problem_solving_count'] += 1
+    
+    if classification['is_helping']:
+        user['help_given_count'] += 1
+    
+    if classification['is_question']:
+        user['question_count'] += 1
+    
+    # Enhanced metrics from training
+    if classification.get('task_completed'):
+        user['tasks_completed'] += 1
+    
+    if classification.get('has_blocker'):
+        user['blockers_reported'] += 1
+    
+    if classification.get('progress_update'):
+        user['progress_updates'] += 1
+
+def merge_user_counters(user_data: Dict[str, Dict], other: Dict[str, Dict]):
+    """
+    Fold the counters of a later shard into user_data.
+    Merging shards in input order gives the same counters, user order and
+    keyword order as adding every record to one dict.
+    """
+    for username, counters in other.items():
+        user = user_data.get(username)
+        if user is None:
+            user_data[username] = counters
+            continue
         
+        for field, value in counters.items():
+            if field == 'technical_keywords':
+                user[field].update(value)
+            else:
+                user[field] += value
+
+def build_contributions(user_data: Dict[str, Dict]) -> List[ContributionMetrics]:
+    """
+    Turn per-user counters into scored ContributionMetrics, best first.
+    Scores, ratios and the active flag are computed over all users at once.
+    """
+    usernames = list(user_data)
+    if not usernames:
+        return []
+    
+    def column(field: str) -> np.ndarray:
+        return np.fromiter((user_data[u][field] for u in usernames), dtype=np.float64, count=len(usernames))
+    
+    total_messages = column('message_count')
+    technical_count = column('technical_count')
+    tasks_completed = column('tasks_completed')
+    
+    # Ratios are 0 for users without messages
+    divisor = np.where(total_messages > 0, total_messages, 1)
+    has_messages = total_messages > 0
+    
+    def ratio(counts: np.ndarray) -> np.ndarray:
+        return np.where(has_messages, counts / divisor, 0)
+    
+    technical_ratio = ratio(technical_count)
+    problem_solving_ratio = ratio(column('problem_solving_count'))
+    help_ratio = ratio(column('help_given_count'))
+    completion_ratio = ratio(tasks_completed)
+    
+    # Weighted score with completion bonus
+    technical_scores = (
+        (technical_ratio * 40) +  # 40% weight on technical content
+        (problem_solving_ratio * 25) +  # 25% weight on problem solving
+        (help_ratio * 15) +  # 15% weight on helping others
+        (completion_ratio * 20)  # 20% weight on task completion
+    )
+    
+    avg_msg_lengths = ratio(column('word_total'))
+    
+    # Determine if user is an active contributor
+    is_active = (
+        (tasks_completed >= 1) |  # Completed at least 1 task
+        (technical_count >= 2) |  # At least 2 technical messages
+        ((technical_ratio >= 0.3) & (total_messages >= 3))  # Or 30% technical with 3+ messages
+    )
+    
+    # Sort by technical contribution score (stable, like list.sort)
+    rounded_scores = [round(score, 2) for score in technical_scores.tolist()]
+    order = np.argsort(-np.array(rounded_scores), kind='stable').tolist()
+    
+    contributions = []
+    for index in order:
+        data = user_data[usernames[index]]
         contributions.append(ContributionMetrics(
-            username=username,
-            technical_contribution_score=round(technical_score, 2),
+            username=usernames[index],
+            technical_contribution_score=rounded_scores[index],
             code_related_messages=data['technical_count'],
             problem_solving_count=data['problem_solving_count'],
             help_given_count=data['help_given_count'],
             question_count=data['question_count'],
-            avg_message_length=round(avg_msg_length, 1),
+            avg_message_length=round(float(avg_msg_lengths[index]), 1),
             technical_keywords_used=list(data['technical_keywords'])[:10],  # Top 10
-            contribution_quality=contribution_quality,
-            is_active_contributor=is_active
+            contribution_quality=calculate_contribution_quality({'technical_score': float(technical_scores[index])}),
+            is_active_contributor=bool(is_active[index])
         ))
     
-    # Sort by technical contribution score
-    contributions.sort(key=lambda x: x.technical_contribution_score, reverse=True)
-    
     return contributions
 
-# --- 5. Create FastAPI App ---
-# Create the main FastAPI application instance
-app = FastAPI()
-
-# --- Startup Event: Train on synthetic data ---
-@app.on_event("startup")
-async def startup_event():
+def analyze_user_contributions(messages: List[ChatMessage], records: Optional[List[Dict]] = None,
+                               model: Optional[ModelSnapshot] = None,
+                               mode: str = 'deep') -> List[ContributionMetrics]:
     """
-    Run training on synthetic data when the service starts.
+    Deeply analyze each user's contributions using NLP and trained patterns.
+    Pass the records from analyze_messages() to reuse an existing analysis pass.
     """
-    print("🚀 Starting AI Chat Analysis Service...")
-    train_on_synthetic_data()
-    print("✅ Service ready!")
+    if records is None:
+        return build_contributions(accumulate_user_counters(messages, model or current_model(), mode))
+    
+    # Aggregate the per-message records by user
+    user_data = {}
+    for record in records:
+        add_user_record(user_data, record)
+    
+    return build_contributions(user_data)
 
-# --- 6. API Endpoints ---
+# --- Sentiment Aggregation ---
 
-# Create a GET endpoint at '/' for a health check
-# It should return a simple JSON object: {"status": "ok"}
-@app.get("/")
-def health_check():
-    return {
-        "status": "ok",
-        "trained": len(TRAINED_PATTERNS['task_completion']) > 0,
-        "training_messages": TRAINING_STATS.get('total_messages', 0)
-    }
+# How per-message VADER scores are combined into overall and per-user
+# sentiment: "mean", "weighted" (by word count) or "legacy" (score the
+# concatenated text again, as earlier versions did)
+SENTIMENT_AGGREGATIONS = ("mean", "weighted", "legacy")
+SENTIMENT_AGGREGATION = os.getenv("SENTIMENT_AGGREGATION", "mean")
+if SENTIMENT_AGGREGATION not in SENTIMENT_AGGREGATIONS:
+    # Fail at startup rather than quietly report sentiment another way
+    raise ValueError(f"SENTIMENT_AGGREGATION must be one of {', '.join(SENTIMENT_AGGREGATIONS)}, "
+                     f"not '{SENTIMENT_AGGREGATION}'")
 
-# Add endpoint to get training statistics
-@app.get("/training_stats")
-def get_training_stats():
-    """
-    Returns statistics about the trained model.
-    """
-    return {
-        "total_training_messages": TRAINING_STATS.get('total_messages', 0),
-        "avg_message_length": round(TRAINING_STATS.get('avg_message_length', 0), 2),
-        "patterns_learned": {
-            "task_completion": len(TRAINED_PATTERNS['task_completion']),
-            "blockers": len(TRAINED_PATTERNS['blockers']),
-            "progress_updates": len(TRAINED_PATTERNS['progress_updates']),
-            "collaboration": len(TRAINED_PATTERNS['collaboration'])
-        },
-        "top_keywords": list(TRAINING_STATS.get('common_patterns', {}).keys())[:15],
-        "active_users_in_training": len(TRAINING_STATS.get('user_activity_distribution', {}))
-    }
+# VADER rounds compound scores to 4 decimals, so totals are kept as exact
+# integers in these units and merging shards in any order gives the same sum
+SENTIMENT_UNITS = 10000
 
-# Add endpoint to manually retrain
-@app.post("/retrain")
-def retrain_model():
+class SentimentTotals:
     """
-    Manually trigger retraining on synthetic data.
+    Mergeable running totals of per-message compound scores.
     """
-    train_on_synthetic_data()
-    return {
-        "status": "retrained",
-        "training_messages": TRAINING_STATS.get('total_messages', 0)
-    }
+    
+    __slots__ = ('message_count', 'word_count', 'score_units', 'weighted_units')
+    
+    def __init__(self):
+        self.message_count = 0
+        self.word_count = 0
+        self.score_units = 0
+        self.weighted_units = 0
+    
+    def add(self, score: float, word_count: int):
+        units = round(score * SENTIMENT_UNITS)
+        self.message_count += 1
+        self.word_count += word_count
+        self.score_units += units
+        self.weighted_units += units * word_count
+    
+    def merge(self, other: 'SentimentTotals'):
+        self.message_count += other.message_count
+        self.word_count += other.word_count
+        self.score_units += other.score_units
+        self.weighted_units += other.weighted_units
+    
+    def value(self, method: Optional[str] = None) -> float:
+        """
+        The combined score (SENTIMENT_AGGREGATION by default). "legacy" needs
+        the original text, so callers that only have totals get the mean.
+        """
+        method = method or SENTIMENT_AGGREGATION
+        if method == "weighted" and self.word_count:
+            return self.weighted_units / self.word_count / SENTIMENT_UNITS
+        if self.message_count:
+            return self.score_units / self.message_count / SENTIMENT_UNITS
+        return 0.0
 
-# Create a POST endpoint at '/analyze'
-# It will accept 'AnalysisInput' data
-# It will return a 'WeeklyReport'
-@app.post("/analyze", response_model=WeeklyReport)
-def analyze_chat(data: AnalysisInput):
-    # --- 7. Analysis Logic (Inside the endpoint) ---
+def sentiment_task(text: str) -> float:
+    with stage_timer('sentiment'):
+        return get_sia().polarity_scores(text)['compound']
 
-    # 1. Combine all message texts into one single block of text
-    full_text = " ".join([msg.text for msg in data.messages])
+# --- Heavy-Hitter Sketch ---
 
-    # Handle edge case: if no text is provided, return a default report
-    if not full_text.strip():
-        return WeeklyReport(
-            overall_sentiment=0.0,
-            top_keywords=[],
-            ai_summary="No messages to analyze."
-        )
+# Counters kept per top-k sketch (keywords, topics, training keywords)
+TOPK_CAPACITY = int(os.getenv("TOPK_CAPACITY", "2048"))
 
-    # 2. Sentiment Analysis (VADER)
-    # Get the 'compound' score from VADER's polarity_scores
-    sentiment_score = sia.polarity_scores(full_text)['compound']
-
-    # 3. Keyword Extraction (spaCy)
-    # Process the full text with the spaCy model
-    doc = nlp(full_text)
-
-    # Create a list of keywords:
-    # A token is a keyword if it's not a stop word,
-    # not punctuation, and is an alphabetical character.
-    # Use the lowercase lemma (root form) of the word.
-    keywords = [
-        token.lemma_.lower() 
-        for token in doc 
-        if not token.is_stop and not token.is_punct and token.is_alpha
-    ]
+class TopKSketch:
+    """
+    Space-Saving heavy-hitter sketch: approximate counts of the most
+    frequent items in at most `capacity` counters, so memory stays constant
+    however many distinct items are added.
+    Until more than capacity distinct items have been seen, the counts are
+    exact and most_common() matches Counter.most_common() (ties in insertion
+    order). After that an unseen item takes over the smallest counter and
+    inherits its count as error: estimates are at most error_bound()
+    (<= total / capacity) above the true count, and every item seen more
+    often than that is kept.
+    """
     
-    # Use Counter to find the 5 most common keywords
-    top_keywords = [word for word, count in Counter(keywords).most_common(5)]
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = max(1, capacity or TOPK_CAPACITY)
+        self.counts = {}
+        self.errors = {}  # overestimate per item, for items that replaced another
+        self.total = 0
+        self.overflowed = False
+        self._heap = None  # lazy min-heap of (count, serial, item), rebuilt on demand
+        self._serial = 0
+    
+    def __len__(self) -> int:
+        return len(self.counts)
+    
+    def __contains__(self, item) -> bool:
+        return item in self.counts
+    
+    def __getstate__(self) -> Dict:
+        # The heap is rebuilt when needed, so it isn't shipped between processes
+        return dict(self.__dict__, _heap=None)
+    
+    def add(self, item, count: int = 1):
+        self.total += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            if self._heap is not None:
+                self._push(item)
+        elif len(counts) < self.capacity:
+            counts[item] = count
+        else:
+            smallest, floor = self._pop_min()
+            del counts[smallest]
+            self.errors.pop(smallest, None)
+            counts[item] = floor + count
+            self.errors[item] = floor
+            self.overflowed = True
+            self._push(item)
+    
+    def update(self, items):
+        for item in items:
+            self.add(item)
+    
+    def most_common(self, n: Optional[int] = None) -> List[tuple]:
+        if n is None:
+            return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+    
+    def error_bound(self) -> int:
+        """
+        Largest possible overestimate of any count (0 while counts are exact).
+        """
+        return min(self.counts.values()) if self.overflowed and self.counts else 0
+    
+    def merge(self, other: 'TopKSketch'):
+        """
+        Fold in another sketch (e.g. from a later shard or day). An item
+        missing from an overflowed sketch may have been counted there up to
+        its error bound, so that is added to both its count and its error.
+        """
+        mine, theirs = self.error_bound(), other.error_bound()
+        counts = {}
+        errors = {}
+        for item in chain(self.counts, (item for item in other.counts if item not in self.counts)):
+            counts[item] = self.counts.get(item, mine) + other.counts.get(item, theirs)
+            error = (self.errors.get(item, 0) if item in self.counts else mine) + \
+                    (other.errors.get(item, 0) if item in other.counts else theirs)
+            if error:
+                errors[item] = error
+        
+        self.overflowed = self.overflowed or other.overflowed
+        if len(counts) > self.capacity:
+            kept = {item for item, _ in heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1))}
+            counts = {item: count for item, count in counts.items() if item in kept}
+            errors = {item: error for item, error in errors.items() if item in kept}
+            self.overflowed = True
+        
+        self.counts = counts
+        self.errors = errors
+        self.total += other.total
+        self._heap = None
+    
+    def _push(self, item):
+        self._serial += 1
+        heapq.heappush(self._heap, (self.counts[item], self._serial, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = None
+    
+    def _pop_min(self) -> tuple:
+        if self._heap is None:
+            self._heap = [(count, serial, item) for serial, (item, count) in enumerate(self.counts.items())]
+            heapq.heapify(self._heap)
+            self._serial = len(self._heap)
+        while True:
+            # Entries whose count is out of date are stale; counts only grow
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
 
-    # 4. Summarization (Simple - faster than Transformers)
-    # Use simple text summarization instead of AI model
-    if summarizer and len(full_text.split()) > 30:
-        summary_result = summarizer(full_text, max_length=100, min_length=25, do_sample=False)
-        ai_summary = summary_result[0]['summary_text']
-    else:
-        # Simple summarization: first 200 chars
-        ai_summary = full_text[:200] + "..." if len(full_text) > 200 else full_text
+# --- Chat Summary and Participation Aggregation ---
 
-    # 5. Return the final report
-    return WeeklyReport(
-        overall_sentiment=sentiment_score,
-        top_keywords=top_keywords,
-        ai_summary=ai_summary
-    )
+# Characters of the joined text kept for the simple /analyze summary
+SUMMARY_PREFIX_CHARS = 200
 
-# Create a POST endpoint at '/analyze_users' to rank users by participation
-@app.post("/analyze_users", response_model=UserRankingReport)
-def analyze_user_participation(data: AnalysisInput):
+# Characters of the joined text handed to the summarizer (SUMMARIZER_MODEL)
+SUMMARIZER_INPUT_CHARS = int(os.getenv("SUMMARIZER_INPUT_CHARS", "4000"))
+
+class ChatSummaryAccumulator:
     """
-    Analyze and rank users based on their participation in the chat.
-    Considers message count, word count, and sentiment to calculate participation score.
+    Running totals behind an /analyze report: sentiment, keyword counts and
+    the start of the joined text (prefix_chars of it) for the summary.
+    With summarize=False the summarizer is never used.
     """
     
-    if not data.messages:
-        return UserRankingReport(
-            total_messages=0,
-            total_users=0,
-            user_rankings=[],
-            most_active_user="None",
-            top_contributors=[]
-        )
-    
-    # Group messages by user
-    user_messages = {}
-    for msg in data.messages:
-        if msg.username not in user_messages:
-            user_messages[msg.username] = []
-        user_messages[msg.username].append(msg.text)
-    
-    # Calculate statistics for each user
-    user_stats_list = []
-    
-    for username, messages in user_messages.items():
-        message_count = len(messages)
+    def __init__(self, prefix_chars: int = SUMMARY_PREFIX_CHARS, summarize: bool = True):
+        self.prefix_chars = max(prefix_chars, SUMMARY_PREFIX_CHARS)
+        self.summarize = summarize
+        self.total_messages = 0
+        self.sentiment = SentimentTotals()
+        self.keywords = TopKSketch()
+        self.has_text = False
+        self.text_prefix = ""
+        self.text_length = 0  # length of the messages joined with spaces
+    
+    def add(self, text: str, entry: Dict):
+        separator = " " if self.total_messages else ""
+        self.total_messages += 1
+        self.sentiment.add(entry['sentiment'], entry['word_count'])
+        self.keywords.update(entry['keywords'])
+        self.has_text = self.has_text or bool(text.strip())
         
-        # Calculate word count
-        word_count = sum(len(msg.split()) for msg in messages)
+        if len(self.text_prefix) <= self.prefix_chars:
+            self.text_prefix = (self.text_prefix + separator + text[:self.prefix_chars + 1])[:self.prefix_chars + 1]
+        self.text_length += len(separator) + len(text)
+    
+    def summary(self) -> str:
+        """
+        The AI summary when SUMMARIZER_MODEL is set (of the first
+        SUMMARIZER_INPUT_CHARS characters), else the first 200 characters.
+        """
+        summarizer = get_summarizer() if self.summarize else None
+        if summarizer and self.sentiment.word_count > 30:
+            summary_result = summarizer(self.text_prefix[:self.prefix_chars], max_length=100, min_length=25, do_sample=False)
+            return summary_result[0]['summary_text']
         
-        # Calculate average sentiment for this user
-        user_text = " ".join(messages)
-        avg_sentiment = sia.polarity_scores(user_text)['compound']
-        
-        # Calculate participation score
-        # Formula: (message_count * 10) + (word_count * 0.5) + (positive sentiment bonus)
-        sentiment_bonus = max(0, avg_sentiment * 20)  # 0-20 bonus for positive sentiment
-        participation_score = (message_count * 10) + (word_count * 0.5) + sentiment_bonus
-        
-        user_stats_list.append({
-            "username": username,
-            "message_count": message_count,
-            "word_count": word_count,
-            "avg_sentiment": round(avg_sentiment, 3),
-            "participation_score": round(participation_score, 2)
-        })
-    
-    # Sort by participation score (descending)
-    user_stats_list.sort(key=lambda x: x["participation_score"], reverse=True)
-    
-    # Add rank to each user
-    ranked_users = []
-    for rank, stats in enumerate(user_stats_list, start=1):
-        ranked_users.append(UserStats(
-            username=stats["username"],
-            message_count=stats["message_count"],
-            word_count=stats["word_count"],
-            avg_sentiment=stats["avg_sentiment"],
-            participation_score=stats["participation_score"],
-            rank=rank
-        ))
-    
-    # Identify most active user and top 3 contributors
-    most_active = ranked_users[0].username if ranked_users else "None"
-    top_contributors = [user.username for user in ranked_users[:3]]
-    
-    return UserRankingReport(
-        total_messages=len(data.messages),
-        total_users=len(user_messages),
-        user_rankings=ranked_users,
-        most_active_user=most_active,
-        top_contributors=top_contributors
-    )
+        # Simple summarization: first 200 chars
+        if self.text_length > SUMMARY_PREFIX_CHARS:
+            return self.text_prefix[:SUMMARY_PREFIX_CHARS] + "..."
+        return self.text_prefix[:SUMMARY_PREFIX_CHARS]
+    
+    def report(self, sentiment_score: Optional[float] = None) -> WeeklyReport:
+        """
+        The /analyze report; sentiment comes from the per-message scores
+        unless a (legacy) score is passed in.
+        """
+        # Handle edge case: if no text is provided, return a default report
+        if not self.has_text:
+            return WeeklyReport(
+                overall_sentiment=0.0,
+                top_keywords=[],
+                ai_summary="No messages to analyze."
+            )
+        
+        if sentiment_score is None:
+            sentiment_score = round(self.sentiment.value(), 4)
+        
+        with stage_timer('summary'):
+            ai_summary = self.summary()
+        
+        return WeeklyReport(
+            overall_sentiment=sentiment_score,
+            top_keywords=[word for word, count in self.keywords.most_common(5)],
+            ai_summary=ai_summary
+        )
 
-# Create a POST endpoint for weekly mentor report
-@app.post("/weekly_report", response_model=WeeklyMentorReport)
-def generate_weekly_mentor_report(data: AnalysisInput):
+class ParticipationAccumulator:
     """
-    Generate a comprehensive weekly report for mentors using trained AI models.
-    Analyzes who is actually working vs just chatting, identifies key discussions,
-    tracks task completion, and provides actionable insights.
+    Running per-user totals behind an /analyze_users ranking.
     """
     
-    if not data.messages:
-        return WeeklyMentorReport(
-            report_period="No data",
-            total_messages=0,
-            total_participants=0,
-            overall_sentiment=0.0,
-            project_momentum="Weak",
-            top_contributors=[],
-            key_discussions=[],
-            technical_topics=[],
-            recommendations=["No activity to analyze"],
-            activity_summary="No messages received this week.",
-            tasks_completed=0,
-            blockers_reported=0,
-            progress_updates=0,
-            collaboration_score=0.0
-        )
-    
-    # Analyze user contributions with enhanced trained patterns
-    contributions = analyze_user_contributions(data.messages)
-    
-    # Calculate overall sentiment
-    full_text = " ".join([msg.text for msg in data.messages])
-    overall_sentiment = sia.polarity_scores(full_text)['compound']
-    
-    # Track task completion, blockers, and progress using trained patterns
-    tasks_completed = 0
-    blockers_reported = 0
-    progress_updates = 0
-    collaboration_count = 0
+    def __init__(self):
+        self.total_messages = 0
+        self.users = {}  # username -> SentimentTotals (also counts messages and words)
+    
+    def add(self, username: str, entry: Dict):
+        self.total_messages += 1
+        user = self.users.get(username)
+        if user is None:
+            user = self.users[username] = SentimentTotals()
+        user.add(entry['sentiment'], entry['word_count'])
+    
+    def merge(self, other: 'ParticipationAccumulator'):
+        self.total_messages += other.total_messages
+        for username, totals in other.users.items():
+            user = self.users.get(username)
+            if user is None:
+                self.users[username] = totals
+            else:
+                user.merge(totals)
+    
+    def user_stats(self) -> List[Dict]:
+        return [
+            participation_stats(username, totals.message_count, totals.word_count, totals.value())
+            for username, totals in self.users.items()
+        ]
+
+# --- Weekly Report Aggregation ---
+
+# Noun chunks that never count as technical topics
+GENERIC_TOPICS = ['team', 'everyone', 'anyone', 'someone']
+
+# Key discussions quoted in a weekly report
+MAX_KEY_DISCUSSIONS = 8
+
+class WeeklyAccumulator:
+    """
+    Running totals behind a weekly report.
+    Records from analyze_messages() are folded in one at a time, so a report
+    can be built (by build_weekly_report) without keeping the messages.
+    """
     
-    for msg in data.messages:
-        doc = nlp(msg.text)
-        classification = enhanced_message_classification(msg.text, doc)
+    def __init__(self):
+        self.total_messages = 0
+        self.sentiment = SentimentTotals()
+        self.tasks_completed = 0
+        self.blockers_reported = 0
+        self.progress_updates = 0
+        self.collaboration_count = 0
+        self.users = {}  # username -> counters from new_user_counters()
+        self.topics = TopKSketch()
+        self.key_discussions = []
+    
+    def add(self, record: Dict):
+        classification = record['classification']
         
+        self.total_messages += 1
+        self.sentiment.add(record['sentiment'], record['word_count'])
+        add_user_record(self.users, record)
+        
+        # Track task completion, blockers, and progress using trained patterns
         if classification.get('task_completed'):
-            tasks_completed += 1
+            self.tasks_completed += 1
         if classification.get('has_blocker'):
-            blockers_reported += 1
+            self.blockers_reported += 1
         if classification.get('progress_update'):
-            progress_updates += 1
+            self.progress_updates += 1
         if classification.get('collaboration'):
-            collaboration_count += 1
+            self.collaboration_count += 1
+        
+        # Noun chunks as potential topics
+        for chunk_text in record['noun_chunks'] or []:
+            if len(chunk_text.split()) <= 3 and chunk_text.lower() not in GENERIC_TOPICS:
+                self.topics.add(chunk_text)
+        
+        # Key discussions: important keywords and a meaningful length
+        if record['is_key_discussion'] and len(self.key_discussions) < MAX_KEY_DISCUSSIONS:
+            text = record['text']
+            if len(text) > 20:
+                discussion_text = f"{record['username']}: {text[:120]}..." if len(text) > 120 else f"{record['username']}: {text}"
+                self.key_discussions.append(discussion_text)
+    
+    def add_all(self, records: List[Dict]):
+        for record in records:
+            self.add(record)
+    
+    def add_batch(self, batch: MessageBatch, entries: List[Dict]):
+        """
+        Fold in a whole MessageBatch and its analyze_texts() entries; same
+        result as add() for each message, without per-message records.
+        """
+        self.total_messages += len(batch)
+        for entry in entries:
+            self.sentiment.add(entry['sentiment'], entry['word_count'])
+        merge_user_counters(self.users, batch.user_counters(entries))
+        
+        for index, entry in enumerate(entries):
+            classification = entry['classification']
+            
+            if classification.get('task_completed'):
+                self.tasks_completed += 1
+            if classification.get('has_blocker'):
+                self.blockers_reported += 1
+            if classification.get('progress_update'):
+                self.progress_updates += 1
+            if classification.get('collaboration'):
+                self.collaboration_count += 1
+            
+            for chunk_text in entry['noun_chunks'] or []:
+                if len(chunk_text.split()) <= 3 and chunk_text.lower() not in GENERIC_TOPICS:
+                    self.topics.add(chunk_text)
+            
+            if entry['is_key_discussion'] and len(self.key_discussions) < MAX_KEY_DISCUSSIONS:
+                text = batch.text(index)
+                if len(text) > 20:
+                    username = batch.username(index)
+                    discussion_text = f"{username}: {text[:120]}..." if len(text) > 120 else f"{username}: {text}"
+                    self.key_discussions.append(discussion_text)
+    
+    def merge(self, other: 'WeeklyAccumulator'):
+        """
+        Fold in the totals of a later shard, as if its records had been added here.
+        """
+        self.total_messages += other.total_messages
+        self.sentiment.merge(other.sentiment)
+        self.tasks_completed += other.tasks_completed
+        self.blockers_reported += other.blockers_reported
+        self.progress_updates += other.progress_updates
+        self.collaboration_count += other.collaboration_count
+        merge_user_counters(self.users, other.users)
+        self.topics.merge(other.topics)
+        
+        room = MAX_KEY_DISCUSSIONS - len(self.key_discussions)
+        self.key_discussions.extend(other.key_discussions[:max(0, room)])
     
-    # Calculate collaboration score (0-100)
-    collaboration_score = min(100, (collaboration_count / len(data.messages)) * 200)
+    def sentiment_score(self) -> float:
+        return self.sentiment.value()
+
+def empty_weekly_report() -> WeeklyMentorReport:
+    """
+    Report returned when there are no messages to analyze.
+    """
+    return WeeklyMentorReport(
+        report_period="No data",
+        total_messages=0,
+        total_participants=0,
+        overall_sentiment=0.0,
+        project_momentum="Weak",
+        top_contributors=[],
+        key_discussions=[],
+        technical_topics=[],
+        recommendations=["No activity to analyze"],
+        activity_summary="No messages received this week.",
+        tasks_completed=0,
+        blockers_reported=0,
+        progress_updates=0,
+        collaboration_score=0.0
+    )
+
+def build_weekly_report(acc: WeeklyAccumulator, model: ModelSnapshot, overall_sentiment: float,
+                        report_period: str) -> WeeklyMentorReport:
+    """
+    Build the mentor report (momentum, recommendations, summary) from the
+    accumulated weekly totals.
+    """
+    if not acc.total_messages:
+        return empty_weekly_report()
     
-    # Extract key technical topics using NLP
-    doc = nlp(full_text)
+    total_messages = acc.total_messages
+    tasks_completed = acc.tasks_completed
+    blockers_reported = acc.blockers_reported
+    progress_updates = acc.progress_updates
     
-    # Extract nouns and proper nouns as potential topics
-    topics = []
-    for chunk in doc.noun_chunks:
-        if len(chunk.text.split()) <= 3 and chunk.text.lower() not in ['team', 'everyone', 'anyone', 'someone']:
-            topics.append(chunk.text)
+    # Score user contributions with enhanced trained patterns
+    contributions = build_contributions(acc.users)
+    
+    # Calculate collaboration score (0-100)
+    collaboration_score = min(100, (acc.collaboration_count / total_messages) * 200)
     
     # Count topic frequency and filter using trained patterns
-    topic_counter = Counter(topics)
     technical_topics = []
     
-    for topic, count in topic_counter.most_common(15):
+    for topic, count in acc.topics.most_common(15):
         # Check if topic appears in training data common patterns
         topic_lower = topic.lower()
-        if count >= 2 or topic_lower in TRAINING_STATS.get('common_patterns', {}):
+        if count >= 2 or topic_lower in model.training_stats.get('common_patterns', {}):
             technical_topics.append(topic)
     
     technical_topics = technical_topics[:10]
-    
-    # Identify key discussions with enhanced pattern matching
-    key_discussions = []
-    important_keywords = [
-        'complete', 'finish', 'implement', 'deploy', 'ready', 'done', 
-        'issue', 'problem', 'solution', 'merged', 'pushed', 'reviewed',
-        'blocked', 'stuck', 'error', 'working on', 'started'
-    ]
-    
-    for msg in data.messages:
-        msg_lower = msg.text.lower()
-        # Check against important keywords and trained patterns
-        if any(keyword in msg_lower for keyword in important_keywords):
-            if len(msg.text) > 20:  # Meaningful length
-                discussion_text = f"{msg.username}: {msg.text[:120]}..." if len(msg.text) > 120 else f"{msg.username}: {msg.text}"
-                key_discussions.append(discussion_text)
-    
-    # Limit to top 8 key discussions
-    key_discussions = key_discussions[:8]
+    key_discussions = list(acc.key_discussions)
     
     # Determine project momentum using trained insights
     active_contributors = [c for c in contributions if c.is_active_contributor]
-    technical_message_ratio = sum(c.code_related_messages for c in contributions) / len(data.messages)
-    completion_rate = tasks_completed / len(data.messages) if len(data.messages) > 0 else 0
+    technical_message_ratio = sum(c.code_related_messages for c in contributions) / total_messages
+    completion_rate = tasks_completed / total_messages if total_messages > 0 else 0
     
     # Enhanced momentum calculation
     if technical_message_ratio >= 0.5 and len(active_contributors) >= 3 and tasks_completed >= 5:
@@ -770,14 +2394,14 @@ def generate_weekly_mentor_report(data: AnalysisInput):
         recommendations.append("😊 Positive team sentiment! Morale is high - great sign for productivity.")
     
     # Activity level analysis compared to training baseline
-    avg_training_msgs = TRAINING_STATS.get('total_messages', 100) / 7  # Rough weekly average
-    if len(data.messages) < avg_training_msgs * 0.3:
-        recommendations.append(f"📉 Communication volume ({len(data.messages)} msgs) is below expected baseline. Encourage daily standups.")
-    elif len(data.messages) > avg_training_msgs * 2:
-        recommendations.append(f"📈 High communication volume ({len(data.messages)} msgs). Team is actively engaged!")
+    avg_training_msgs = model.training_stats.get('total_messages', 100) / 7  # Rough weekly average
+    if total_messages < avg_training_msgs * 0.3:
+        recommendations.append(f"📉 Communication volume ({total_messages} msgs) is below expected baseline. Encourage daily standups.")
+    elif total_messages > avg_training_msgs * 2:
+        recommendations.append(f"📈 High communication volume ({total_messages} msgs). Team is actively engaged!")
     
     # Progress update analysis
-    if progress_updates < len(data.messages) * 0.1:
+    if progress_updates < total_messages * 0.1:
         recommendations.append("📝 Few progress updates detected. Encourage team to share status updates regularly.")
     
     # Technical topic diversity
@@ -792,7 +2416,7 @@ def generate_weekly_mentor_report(data: AnalysisInput):
     summary_parts = []
     
     # Opening statement
-    summary_parts.append(f"This week, the team exchanged {len(data.messages)} messages with {len(contributions)} active participants.")
+    summary_parts.append(f"This week, the team exchanged {total_messages} messages with {len(contributions)} active participants.")
     
     # Technical activity
     tech_percentage = int(technical_message_ratio * 100)
@@ -832,12 +2456,9 @@ def generate_weekly_mentor_report(data: AnalysisInput):
     
     activity_summary = " ".join(summary_parts)
     
-    # Determine report period with timestamp
-    report_period = f"Week of {datetime.now().strftime('%B %d, %Y')}"
-    
     return WeeklyMentorReport(
         report_period=report_period,
-        total_messages=len(data.messages),
+        total_messages=total_messages,
         total_participants=len(contributions),
         overall_sentiment=round(overall_sentiment, 3),
         project_momentum=momentum,
@@ -852,8 +2473,1241 @@ def generate_weekly_mentor_report(data: AnalysisInput):
         collaboration_score=round(collaboration_score, 2)
     )
 
+def compute_weekly_report(messages: List[ChatMessage], model: ModelSnapshot,
+                          parallel: bool = True, mode: str = 'deep') -> WeeklyMentorReport:
+    """
+    Analyze a list of messages and build their weekly mentor report.
+    Inputs above SHARD_THRESHOLD are split across the worker pool unless
+    parallel=False (e.g. when already running inside a worker).
+    """
+    if not messages:
+        return empty_weekly_report()
+    
+    sentiment_future = None
+    if SENTIMENT_AGGREGATION == "legacy":
+        full_text = " ".join([msg.text for msg in messages])
+    
+    if parallel and should_shard(len(messages)):
+        if SENTIMENT_AGGREGATION == "legacy":
+            # Score the overall sentiment on the pool while the shards run
+            sentiment_future = get_executor().submit(sentiment_task, full_text)
+        acc = accumulate_weekly(messages, model, mode)
+    else:
+        acc = weekly_shard_task(messages, model, mode)
+    
+    # Calculate overall sentiment from the per-message scores
+    if sentiment_future is not None:
+        overall_sentiment = sentiment_future.result()
+    elif SENTIMENT_AGGREGATION == "legacy":
+        overall_sentiment = sentiment_task(full_text)
+    else:
+        overall_sentiment = acc.sentiment_score()
+    
+    # Determine report period with timestamp
+    report_period = f"Week of {datetime.now().strftime('%B %d, %Y')}"
+    
+    with stage_timer('report'):
+        return build_weekly_report(acc, model, overall_sentiment, report_period)
+
+# --- Parallel Workers ---
+
+# Worker pool for CPU-bound fan-out. spaCy and VADER hold the GIL, so
+# processes are used by default; "thread" is available for environments
+# that can't fork.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ANALYSIS_EXECUTOR = os.getenv("ANALYSIS_EXECUTOR", "process")
+
+_executor = None
+EXECUTOR_LOCK = threading.Lock()
+
+def get_executor():
+    """
+    Return the shared worker pool, creating it on first use.
+    Each worker process loads its own models lazily and keeps them.
+    """
+    global _executor
+    if _executor is None:
+        with EXECUTOR_LOCK:
+            if _executor is None:
+                if ANALYSIS_EXECUTOR == "thread":
+                    _executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS)
+                else:
+                    _executor = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+    return _executor
+
+def project_report_task(project_id: str, messages: List[ChatMessage], model: ModelSnapshot,
+                        mode: str = 'deep') -> ProjectWeeklyReport:
+    """
+    Worker task for the batch endpoint: one project's weekly report.
+    The model snapshot is passed in so every worker uses the caller's model.
+    """
+    try:
+        report = compute_weekly_report(messages, model, parallel=False, mode=mode)
+        return ProjectWeeklyReport(project_id=project_id, report=report)
+    except Exception as e:
+        return ProjectWeeklyReport(project_id=project_id, error=str(e))
+
+# --- Sharded Analysis ---
+
+# Messages in one request above which its analysis is split across the pool
+SHARD_THRESHOLD = int(os.getenv("SHARD_THRESHOLD", "5000"))
+
+def should_shard(message_count: int) -> bool:
+    return ANALYSIS_WORKERS > 1 and message_count > SHARD_THRESHOLD
+
+def split_shards(items: List, shard_count: int = None) -> List[List]:
+    """
+    Split items into contiguous, roughly equal shards (one per worker by
+    default), so merging the results in order matches a sequential pass.
+    """
+    shard_count = max(1, shard_count or ANALYSIS_WORKERS)
+    size = max(1, -(-len(items) // shard_count))
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def weekly_shard_task(messages: List[ChatMessage], model: ModelSnapshot, mode: str = 'deep') -> WeeklyAccumulator:
+    # Single NLP pass: every later statistic is derived from these entries.
+    # Weekly reports don't look at timestamps, so none are parsed
+    batch = MessageBatch.from_messages(messages, with_timestamps=False)
+    entries = analyze_texts(batch.texts(), with_topics=True, model=model, mode=mode)
+    acc = WeeklyAccumulator()
+    with stage_timer('aggregation'):
+        acc.add_batch(batch, entries)
+    return acc
+
+def user_counters_shard_task(messages: List[ChatMessage], model: ModelSnapshot,
+                             mode: str = 'deep') -> Dict[str, Dict]:
+    batch = MessageBatch.from_messages(messages, with_timestamps=False)
+    return batch.user_counters(analyze_texts(batch.texts(), model=model, mode=mode))
+
+def accumulate_weekly(messages: List[ChatMessage], model: ModelSnapshot, mode: str = 'deep') -> WeeklyAccumulator:
+    """
+    Analyze the messages in shards on the worker pool and merge the
+    accumulators in input order.
+    """
+    executor = get_executor()
+    futures = [executor.submit(weekly_shard_task, shard, model, mode) for shard in split_shards(messages)]
+    
+    acc = WeeklyAccumulator()
+    for future in futures:
+        acc.merge(future.result())
+    return acc
+
+def accumulate_user_counters(messages: List[ChatMessage], model: ModelSnapshot,
+                             mode: str = 'deep') -> Dict[str, Dict]:
+    """
+    Per-user contribution counters for the messages, sharded over the
+    worker pool when the input is large enough.
+    """
+    if not should_shard(len(messages)):
+        return user_counters_shard_task(messages, model, mode)
+    
+    executor = get_executor()
+    futures = [executor.submit(user_counters_shard_task, shard, model, mode) for shard in split_shards(messages)]
+    
+    user_data = {}
+    for future in futures:
+        merge_user_counters(user_data, future.result())
+    return user_data
+
+def participation_shard_task(messages: List[ChatMessage], model: ModelSnapshot,
+                             mode: str = 'deep') -> ParticipationAccumulator:
+    entries = analyze_texts([msg.text for msg in messages], model=model, mode=mode)
+    acc = ParticipationAccumulator()
+    with stage_timer('aggregation'):
+        for msg, entry in zip(messages, entries):
+            acc.add(msg.username, entry)
+    return acc
+
+def legacy_participation_stats_task(user_messages: List[tuple]) -> List[Dict]:
+    """
+    Participation statistics for (username, message texts) pairs, in order,
+    scoring each user's concatenated text (SENTIMENT_AGGREGATION=legacy).
+    """
+    user_stats_list = []
+    
+    for username, messages in user_messages:
+        message_count = len(messages)
+        
+        # Calculate word count
+        word_count = sum(len(msg.split()) for msg in messages)
+        
+        # Calculate average sentiment for this user
+        user_text = " ".join(messages)
+        avg_sentiment = get_sia().polarity_scores(user_text)['compound']
+        
+        user_stats_list.append(participation_stats(username, message_count, word_count, avg_sentiment))
+    
+    return user_stats_list
+
+def participation_stats(username: str, message_count: int, word_count: int, avg_sentiment: float) -> Dict:
+    """
+    One user's participation entry, scored.
+    """
+    # Calculate participation score
+    # Formula: (message_count * 10) + (word_count * 0.5) + (positive sentiment bonus)
+    sentiment_bonus = max(0, avg_sentiment * 20)  # 0-20 bonus for positive sentiment
+    participation_score = (message_count * 10) + (word_count * 0.5) + sentiment_bonus
+    
+    return {
+        "username": username,
+        "message_count": message_count,
+        "word_count": word_count,
+        "avg_sentiment": round(avg_sentiment, 3),
+        "participation_score": round(participation_score, 2)
+    }
+
+def build_user_ranking(user_stats_list: List[Dict], total_messages: int) -> UserRankingReport:
+    """
+    Rank the participation entries and build the report.
+    The entries are validated once, as part of the report, instead of each
+    being copied into a UserStats first.
+    """
+    # Sort by participation score (descending)
+    user_stats_list.sort(key=lambda x: x["participation_score"], reverse=True)
+    
+    # Add rank to each user
+    for rank, stats in enumerate(user_stats_list, start=1):
+        stats["rank"] = rank
+    
+    # Identify most active user and top 3 contributors
+    most_active = user_stats_list[0]["username"] if user_stats_list else "None"
+    top_contributors = [stats["username"] for stats in user_stats_list[:3]]
+    
+    return UserRankingReport.model_validate({
+        "total_messages": total_messages,
+        "total_users": len(user_stats_list),
+        "user_rankings": user_stats_list,
+        "most_active_user": most_active,
+        "top_contributors": top_contributors
+    })
+
+def compute_user_ranking(messages: List[ChatMessage], model: ModelSnapshot,
+                         mode: str = 'deep') -> UserRankingReport:
+    """
+    The /analyze_users report for a list of messages.
+    """
+    if not messages:
+        return UserRankingReport(
+            total_messages=0,
+            total_users=0,
+            user_rankings=[],
+            most_active_user="None",
+            top_contributors=[]
+        )
+    
+    if SENTIMENT_AGGREGATION != "legacy":
+        # Per-message scores (cached), combined per user; big inputs are sharded
+        if should_shard(len(messages)):
+            executor = get_executor()
+            futures = [
+                executor.submit(participation_shard_task, shard, model, mode)
+                for shard in split_shards(messages)
+            ]
+            acc = ParticipationAccumulator()
+            for future in futures:
+                acc.merge(future.result())
+        else:
+            acc = participation_shard_task(messages, model, mode)
+        return build_user_ranking(acc.user_stats(), len(messages))
+    
+    # Group messages by user
+    user_messages = {}
+    for msg in messages:
+        if msg.username not in user_messages:
+            user_messages[msg.username] = []
+        user_messages[msg.username].append(msg.text)
+    
+    # Calculate statistics for each user; big inputs are split by user across the pool
+    if should_shard(len(messages)):
+        executor = get_executor()
+        futures = [
+            executor.submit(legacy_participation_stats_task, shard)
+            for shard in split_shards(list(user_messages.items()))
+        ]
+        user_stats_list = [stats for future in futures for stats in future.result()]
+    else:
+        user_stats_list = legacy_participation_stats_task(list(user_messages.items()))
+    
+    return build_user_ranking(user_stats_list, len(messages))
+
+# --- Incremental Ingest State ---
+
+# Weeks of aggregates kept per project for the ingest API
+INGEST_RETENTION_WEEKS = int(os.getenv("INGEST_RETENTION_WEEKS", "12"))
+
+# project_id -> ISO week -> {'acc': WeeklyAccumulator, 'message_ids': set}
+PROJECT_WEEKS = defaultdict(dict)
+INGEST_LOCK = threading.Lock()
+
+def parse_timestamp(timestamp: Optional[str]) -> datetime:
+    """
+    Parse an ISO 8601 timestamp (a trailing 'Z' is allowed) into an aware UTC
+    datetime. Naive timestamps are taken as UTC; a missing one means now.
+    """
+    if not timestamp:
+        return datetime.now(timezone.utc)
+    
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def iso_week_key(moment: datetime) -> str:
+    """
+    ISO week label such as "2025-W34".
+    """
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def week_report_period(week_key: str) -> str:
+    """
+    Report period label for an ISO week, matching the /weekly_report wording.
+    """
+    year, week = week_key.split('-W')
+    monday = date.fromisocalendar(int(year), int(week), 1)
+    return f"Week of {monday.strftime('%B %d, %Y')}"
+
+def prune_project_weeks(weeks: Dict[str, Dict]):
+    """
+    Drop the oldest weeks beyond INGEST_RETENTION_WEEKS (call with INGEST_LOCK held).
+    """
+    excess = len(weeks) - max(1, INGEST_RETENTION_WEEKS)
+    for week_key in sorted(weeks)[:max(0, excess)]:
+        del weeks[week_key]
+
+# --- Activity Timeline ---
+
+DAY_MICROS = 24 * 60 * 60 * 1000000
+TIMELINE_BUCKETS = ('day', 'week')
+# Longest trailing window, in days (ten years)
+TIMELINE_MAX_WINDOW_DAYS = 3660
+
+class ActivityIndex:
+    """
+    Dated messages of a MessageBatch sorted by time, with prefix sums of the
+    per-message counters, so the totals of any time range are two binary
+    searches and a subtraction away.
+    """
+    
+    def __init__(self, batch: MessageBatch, entries: List[Dict]):
+        dated = np.flatnonzero(batch.timestamps != MISSING_TIMESTAMP)
+        order = dated[np.argsort(batch.timestamps[dated], kind='stable')]
+        
+        self.users = batch.users
+        self.undated = len(batch) - len(order)
+        self.times = batch.timestamps[order]
+        self.user_ids = batch.user_ids[order]
+        
+        def prefix(values) -> np.ndarray:
+            column = np.fromiter(values, dtype=np.int64, count=len(entries))[order]
+            return np.concatenate(([0], np.cumsum(column)))
+        
+        units = [round(entry['sentiment'] * SENTIMENT_UNITS) for entry in entries]
+        words = [entry['word_count'] for entry in entries]
+        self.word_sums = prefix(words)
+        self.unit_sums = prefix(units)
+        self.weighted_sums = prefix(u * w for u, w in zip(units, words))
+        self.task_sums = prefix(bool(entry['classification'].get('task_completed')) for entry in entries)
+        self.blocker_sums = prefix(bool(entry['classification'].get('has_blocker')) for entry in entries)
+    
+    def stats(self, start: int, end: int) -> Dict:
+        """
+        Totals for messages with start <= timestamp < end (microseconds).
+        """
+        lo = int(np.searchsorted(self.times, start, side='left'))
+        hi = int(np.searchsorted(self.times, end, side='left'))
+        
+        sentiment = SentimentTotals()
+        sentiment.message_count = hi - lo
+        sentiment.word_count = int(self.word_sums[hi] - self.word_sums[lo])
+        sentiment.score_units = int(self.unit_sums[hi] - self.unit_sums[lo])
+        sentiment.weighted_units = int(self.weighted_sums[hi] - self.weighted_sums[lo])
+        
+        user_ids, counts = np.unique(self.user_ids[lo:hi], return_counts=True)
+        
+        return {
+            'start': micros_to_iso(start),
+            'end': micros_to_iso(end),
+            'message_count': hi - lo,
+            'active_users': len(user_ids),
+            'avg_sentiment': round(sentiment.value(), 3),
+            'tasks_completed': int(self.task_sums[hi] - self.task_sums[lo]),
+            'blockers_reported': int(self.blocker_sums[hi] - self.blocker_sums[lo]),
+            'participation': {self.users[u]: c for u, c in zip(user_ids.tolist(), counts.tolist())}
+        }
+    
+    def bucket_starts(self, bucket: str) -> List[int]:
+        """
+        Start (microseconds) of every day or ISO week that has messages.
+        """
+        days = self.times // DAY_MICROS
+        if bucket == 'week':
+            # The epoch was a Thursday; shift so buckets start on Monday
+            days = (days + 3) // 7 * 7 - 3
+        return (np.unique(days) * DAY_MICROS).tolist()
+
+def micros_to_iso(micros: int) -> str:
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+def build_activity_timeline(batch: MessageBatch, entries: List[Dict], bucket: str,
+                            windows: List[int], end: int) -> ActivityTimeline:
+    """
+    Per-bucket activity in one pass over the messages, plus each trailing
+    window (in days, ending at `end`) rolled up from the same time index.
+    """
+    index = ActivityIndex(batch, entries)
+    bucket_micros = DAY_MICROS * (7 if bucket == 'week' else 1)
+    
+    return ActivityTimeline(
+        bucket=bucket,
+        buckets=[
+            ActivityStats(**index.stats(start, start + bucket_micros))
+            for start in index.bucket_starts(bucket)
+        ],
+        windows=[
+            ActivityWindow(days=days, **index.stats(end - days * DAY_MICROS, end))
+            for days in windows
+        ],
+        undated_messages=index.undated
+    )
+
+# --- Fast Response Encoding ---
+# For a returned model FastAPI dumps it to a dict, validates that against
+# response_model, serializes it again and encodes the result with
+# json.dumps: about three times the cost of the serialization itself on a
+# large ranking. Reports are built and validated here, so with
+# FAST_RESPONSES=1 they are encoded once by pydantic-core's compiled
+# serializer and returned as ready-made JSON bytes.
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "0") == "1"
+
+# Gzip responses of at least GZIP_MIN_SIZE bytes for clients that accept it
+# (0 disables). Level 1 already shrinks report JSON over 10x at a fraction of the
+# cost of the default level 9.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "0"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "1"))
+
+# Headers of the injected Response that a pre-encoded response must carry over
+PASSTHROUGH_HEADERS = ('etag', 'x-model-version')
+
+def fast_response(result, response: Optional[Response] = None):
+    """
+    With FAST_RESPONSES, turn a report model (or its already encoded JSON)
+    into a Response that FastAPI sends as is. Anything else, or everything
+    when FAST_RESPONSES is off, is returned unchanged.
+    """
+    if not FAST_RESPONSES or isinstance(result, Response):
+        return result
+    if isinstance(result, BaseModel):
+        result = result.model_dump_json()
+    encoded = Response(content=result, media_type="application/json")
+    if response is not None:
+        for name in PASSTHROUGH_HEADERS:
+            if name in response.headers:
+                encoded.headers[name] = response.headers[name]
+    return encoded
+
+# --- Whole-Response Cache ---
+# Dashboards re-send the same message list on every refresh. Finished
+# /weekly_report and /analyze_users responses are cached by a hash of the
+# canonical input and the model version, and that hash doubles as the ETag,
+# so a repeat is a hash lookup and a revalidation with If-None-Match is a 304.
+
+class ResponseCache(AnalysisCache):
+    """
+    AnalysisCache whose entries also expire ttl_seconds after they were stored.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        super().__init__(max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.expirations = 0
+    
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return item[1]
+    
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self.ttl_seconds, value))
+    
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self.lock:
+            stats.update(ttl_seconds=self.ttl_seconds, expirations=self.expirations)
+        return stats
+
+# Shared cache; cleared whenever a new model is installed
+RESPONSE_CACHE = ResponseCache(
+    int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+    float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+)
+
+def response_cache_key(endpoint: str, data: BaseModel, model: ModelSnapshot, *extra: str) -> str:
+    """
+    Hash of everything a response depends on. model_dump_json() is the
+    canonical input: fields in model order with defaults filled in, so key
+    order and omitted optional fields in the request don't matter.
+    """
+    digest = hashlib.blake2b(data.model_dump_json().encode('utf-8'), digest_size=16)
+    for part in (endpoint, model.version or '', SENTIMENT_AGGREGATION) + extra:
+        digest.update(b'\0' + part.encode('utf-8'))
+    return digest.hexdigest()
+
+def if_none_match_tags(if_none_match: Optional[str]) -> List[str]:
+    if not if_none_match:
+        return []
+    return [tag.strip() for tag in if_none_match.split(',')]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return any(tag.removeprefix('W/') == etag for tag in if_none_match_tags(if_none_match))
+
+def cached_response(endpoint: str, data: BaseModel, model: ModelSnapshot, request: Optional[Request],
+                    response: Optional[Response], compute, *extra: str):
+    """
+    Serve compute() through RESPONSE_CACHE with an ETag.
+    Responses are deterministic for a key, so a matching If-None-Match gets
+    a 304 whether or not the response is still cached. With FAST_RESPONSES
+    the encoded JSON is cached, so a hit doesn't serialize again.
+    """
+    etag = f'"{response_cache_key(endpoint, data, model, *extra)}"'
+    if_none_match = request.headers.get('if-none-match') if request is not None else None
+    # RFC 9110 13.1.2 answers a failed If-None-Match on POST with 412, and
+    # 304 only on GET/HEAD. These POSTs are deliberately treated as GETs
+    # with a body: they change nothing, the body is the query and the ETag
+    # identifies the response, so a matching tag is a cache revalidation
+    # and gets 304 (the point of the ETag for re-posting dashboards).
+    # "*" can't revalidate anything: it is the "only if nothing exists yet"
+    # precondition of a write, which fails here as the RFC says, with 412.
+    if '*' in if_none_match_tags(if_none_match):
+        return Response(status_code=412, headers={'X-Model-Version': model.version or 'untrained'})
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'X-Model-Version': model.version or 'untrained'})
+    if response is not None:
+        response.headers['ETag'] = etag
+    
+    result = RESPONSE_CACHE.get(etag)
+    if result is None:
+        result = compute()
+        if FAST_RESPONSES:
+            result = result.model_dump_json()
+        RESPONSE_CACHE.put(etag, result)
+    return fast_response(result, response)
+
+# --- Streaming NDJSON Input ---
+
+def parse_ndjson_message(line: bytes, line_number: int) -> Optional[ChatMessage]:
+    """
+    Parse one NDJSON line into a ChatMessage; blank lines are skipped.
+    """
+    if not line.strip():
+        return None
+    try:
+        return ChatMessage.model_validate_json(line)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid message on line {line_number}: {e.errors()[0]['msg']}")
+
+async def iter_ndjson_batches(request: Request, batch_size: int = NLP_BATCH_SIZE):
+    """
+    Yield batches of ChatMessage parsed from a newline-delimited JSON request
+    body as it arrives, so only one batch and one partial line are held at a time.
+    """
+    buffer = b""
+    batch = []
+    line_number = 0
+    
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        
+        for line in lines:
+            line_number += 1
+            message = parse_ndjson_message(line, line_number)
+            if message is not None:
+                batch.append(message)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    
+    message = parse_ndjson_message(buffer, line_number + 1)
+    if message is not None:
+        batch.append(message)
+    if batch:
+        yield batch
+
+# --- 5. Create FastAPI App ---
+# Create the main FastAPI application instance
+app = FastAPI()
+
+if GZIP_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
+# Set WARMUP_MODELS=1 to load spaCy and VADER in the background after startup,
+# so the first analysis request doesn't pay for loading them
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "0") == "1"
+
+# Startup progress, reported by /ready
+STARTUP_TIMINGS = {
+    'import_seconds': None,         # module import
+    'startup_seconds': None,        # import + model artifact load (or training)
+    'warmup_seconds': None,         # import + background model warm-up
+    'first_request_seconds': None   # import until the first request was answered
+}
+
+WARMUP_STATE = {'status': 'disabled'}  # "disabled", "running", "done" or "failed"
+
+def warm_up_models():
+    """
+    Load spaCy and VADER and push one message through every pipeline step.
+    """
+    WARMUP_STATE['status'] = 'running'
+    try:
+        get_sia().polarity_scores("warm up")
+        for purpose in PIPELINE_COMPONENTS:
+            list(parse_texts(["Warming up the analysis pipeline."], purpose))
+        get_summarizer()
+    except Exception as e:
+        WARMUP_STATE['status'] = 'failed'
+        print(f"Warning: model warm-up failed: {e}")
+        return
+    
+    WARMUP_STATE['status'] = 'done'
+    STARTUP_TIMINGS['warmup_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    print(f"🔥 Models warmed up ({STARTUP_TIMINGS['warmup_seconds']}s after import)")
+
+# --- Startup Event: Load the trained model ---
+@app.on_event("startup")
+async def startup_event():
+    """
+    Load the persisted model artifact when the service starts.
+    Falls back to training on synthetic data if there is no artifact yet.
+    """
+    print("🚀 Starting AI Chat Analysis Service...")
+    load_or_train_model()
+    STARTUP_TIMINGS['startup_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    
+    if WARMUP_MODELS:
+        WARMUP_STATE['status'] = 'running'
+        threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
+    
+    print(f"✅ Service ready! ({STARTUP_TIMINGS['startup_seconds']}s after import)")
+
+# Record the import-to-first-request time once
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    response = await call_next(request)
+    if STARTUP_TIMINGS['first_request_seconds'] is None:
+        STARTUP_TIMINGS['first_request_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+        print(f"⏱️  First request answered {STARTUP_TIMINGS['first_request_seconds']}s after import")
+    return response
+
+# Count every request and time it, labelled by route template
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route path (e.g. /projects/{project_id}/messages) keeps the label set small;
+        # streamed bodies are timed until their headers are sent
+        route = request.scope.get('route')
+        endpoint = route.path if route is not None else 'unmatched'
+        REQUEST_COUNT.inc((endpoint, request.method, str(status)))
+        REQUEST_LATENCY.observe(time.perf_counter() - started, (endpoint,))
+
+# Profile requests that ask for it (only with PROFILING_ENABLED=1)
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not PROFILING_ENABLED or not profile_requested(request):
+        return await call_next(request)
+    
+    profile = RequestProfile(request.method, request.url.path)
+    token = ACTIVE_PROFILE.set(profile)
+    start_tracemalloc()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        wall_seconds = time.perf_counter() - started
+        stop_tracemalloc()
+        ACTIVE_PROFILE.reset(token)
+    
+    summary = await run_in_threadpool(profile.save, PROFILE_DIR, wall_seconds)
+    response.headers['X-Profile-Id'] = profile.profile_id
+    print(f"🔬 Profiled {request.method} {request.url.path} in {summary['wall_seconds']:.3f}s -> "
+          f"{os.path.join(PROFILE_DIR, profile.profile_id)}.json")
+    return response
+
+# --- 6. API Endpoints ---
+
+# Create a GET endpoint at '/' for a health check
+# It should return a simple JSON object: {"status": "ok"}
+@app.get("/")
+def health_check():
+    model = current_model()
+    return {
+        "status": "ok",
+        "trained": len(model.trained_patterns['task_completion']) > 0,
+        "training_messages": model.training_stats.get('total_messages', 0),
+        "model_version": model.version
+    }
+
+# Readiness check, separate from the '/' liveness check
+@app.get("/ready")
+def readiness_check():
+    """
+    Reports which models are loaded and how long startup took.
+    Returns 503 until startup has loaded (or tried to train) the model and,
+    if enabled, the warm-up finished. Without an artifact or training data
+    the service still answers, untrained, so that counts as ready too;
+    model_state tells the two apart.
+    """
+    model = current_model()
+    if model.version is not None:
+        model_state = "trained"
+    elif STARTUP_TIMINGS['startup_seconds'] is not None:
+        model_state = "untrained"
+    else:
+        model_state = "loading"
+    ready = model_state != "loading" and WARMUP_STATE['status'] in ('disabled', 'done')
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "model_state": model_state,  # "loading", "trained" or "untrained"
+            "model_version": model.version,
+            "models_loaded": {
+                "trained_patterns": model.version is not None,
+                "spacy": _nlp is not None,
+                "vader": _sia is not None,
+                "summarizer": _summarizer is not None
+            },
+            "warmup": WARMUP_STATE['status'],
+            "model_load_seconds": MODEL_LOAD_SECONDS,
+            "startup_timings": STARTUP_TIMINGS
+        }
+    )
+
+# Add endpoint to get training statistics
+@app.get("/training_stats")
+def get_training_stats():
+    """
+    Returns statistics about the trained model.
+    """
+    model = current_model()
+    return {
+        "model_version": model.version,
+        "model_created_at": model.created_at,
+        "model_source": model.source,
+        "total_training_messages": model.training_stats.get('total_messages', 0),
+        "avg_message_length": round(model.training_stats.get('avg_message_length', 0), 2),
+        "patterns_learned": {
+            "task_completion": len(model.trained_patterns['task_completion']),
+            "blockers": len(model.trained_patterns['blockers']),
+            "progress_updates": len(model.trained_patterns['progress_updates']),
+            "collaboration": len(model.trained_patterns['collaboration'])
+        },
+        "top_keywords": list(model.training_stats.get('common_patterns', {}).keys())[:15],
+        "active_users_in_training": len(model.training_stats.get('user_activity_distribution', {}))
+    }
+
+# Add endpoint to inspect the per-message analysis cache
+@app.get("/cache_stats")
+def get_cache_stats():
+    """
+    Returns hit/miss/eviction counters of the per-message analysis cache
+    and, under "response_cache", of the whole-response cache.
+    """
+    return dict(ANALYSIS_CACHE.stats(), response_cache=RESPONSE_CACHE.stats())
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Request counts and latencies per route, per-stage analysis timings,
+    messages processed, input sizes, training durations and analysis cache
+    counters, in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    
+    for prefix, cache, description in [
+        ('chat_analysis_cache', ANALYSIS_CACHE, 'per-message analysis cache'),
+        ('chat_analysis_response_cache', RESPONSE_CACHE, 'whole-response cache')
+    ]:
+        stats = cache.stats()
+        for name, kind in [('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('entries', 'gauge')]:
+            metric_name = f"{prefix}_{name}" + ("_total" if kind == 'counter' else "")
+            help_text = f"Entries held in the {description}." if name == 'entries' else f"{name.capitalize()} of the {description}."
+            lines.extend([f"# HELP {metric_name} {help_text}", f"# TYPE {metric_name} {kind}", f"{metric_name} {stats[name]}"])
+    
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Fetch a saved request profile
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """
+    Returns the summary of a profiled request: per-stage timings and
+    allocation peaks, and the functions with the most cumulative time.
+    The full CPU profile is <PROFILE_DIR>/<profile_id>.prof.
+    """
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_ENABLED=1)")
+    if not re.fullmatch(r"[0-9A-Za-z-]+", profile_id):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as summary:
+            return json.load(summary)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+
+# State of the most recent background retraining job, reported by /retrain/status
+RETRAIN_STATE = {
+    'status': 'idle',  # "idle", "running", "done" or "failed"
+    'job_id': 0,
+    'started_at': None,
+    'finished_at': None,
+    'rows_processed': 0,
+    'model_version': None,
+    'error': None
+}
+RETRAIN_LOCK = threading.Lock()
+
+def run_retraining():
+    """
+    Background retraining job: train a new snapshot, swap it in, save it.
+    Requests already running keep the snapshot they started with.
+    """
+    def report_progress(rows_done: int):
+        RETRAIN_STATE['rows_processed'] = rows_done
+    
+    try:
+        model = train_model_snapshot(progress=report_progress)
+        if model is None:
+            raise RuntimeError("No training data available")
+        
+        install_model(model)
+        save_model_artifact_safely(model)
+        
+        RETRAIN_STATE['model_version'] = model.version
+        RETRAIN_STATE['status'] = 'done'
+    except Exception as e:
+        RETRAIN_STATE['error'] = str(e)
+        RETRAIN_STATE['status'] = 'failed'
+        print(f"Error during retraining: {e}")
+    finally:
+        RETRAIN_STATE['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+
+# Add endpoint to manually retrain
+@app.post("/retrain", status_code=202)
+def retrain_model():
+    """
+    Start retraining on synthetic data in the background.
+    The new model is swapped in atomically when training finishes and is
+    also saved as the artifact loaded on the next startup.
+    Poll /retrain/status for progress.
+    """
+    with RETRAIN_LOCK:
+        if RETRAIN_STATE['status'] == 'running':
+            return {"status": "already_running", "retrain": RETRAIN_STATE}
+        
+        RETRAIN_STATE.update({
+            'status': 'running',
+            'job_id': RETRAIN_STATE['job_id'] + 1,
+            'started_at': datetime.utcnow().isoformat() + 'Z',
+            'finished_at': None,
+            'rows_processed': 0,
+            'model_version': None,
+            'error': None
+        })
+        threading.Thread(target=run_retraining, name="retrain", daemon=True).start()
+    
+    return {"status": "started", "job_id": RETRAIN_STATE['job_id'], "serving_model_version": current_model().version}
+
+# Add endpoint to follow a background retraining job
+@app.get("/retrain/status")
+def retrain_status():
+    """
+    Returns the progress of the latest retraining job and the model version now serving.
+    """
+    return {
+        "serving_model_version": current_model().version,
+        "retrain": RETRAIN_STATE
+    }
+
+def set_model_version_header(response: Optional[Response], model: ModelSnapshot):
+    """
+    Tell the caller which model version produced a response.
+    """
+    if response is not None:
+        response.headers['X-Model-Version'] = model.version or 'untrained'
+
+def resolve_analysis_mode(mode: Optional[str]) -> str:
+    """
+    The requested analysis mode, or ANALYSIS_MODE when none was given.
+    """
+    mode = mode or DEFAULT_ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(ANALYSIS_MODES)}")
+    return mode
+
+# Create a POST endpoint at '/analyze'
+# It will accept 'AnalysisInput' data
+# It will return a 'WeeklyReport'
+@app.post("/analyze", response_model=WeeklyReport)
+@profiled
+def analyze_chat(data: AnalysisInput, mode: Optional[str] = None, response: Response = None):
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    record_input('/analyze', len(data.messages))
+    
+    # --- 7. Analysis Logic (Inside the endpoint) ---
+
+    # 1. Analyze the messages in bounded chunks, folding each chunk into
+    # running totals so memory doesn't grow with the input.
+    # Only the deep mode uses the summarizer.
+    summarize = mode == 'deep'
+    acc = ChatSummaryAccumulator(
+        SUMMARIZER_INPUT_CHARS if SUMMARIZER_MODEL and summarize else SUMMARY_PREFIX_CHARS,
+        summarize=summarize
+    )
+    for start in range(0, len(data.messages), NLP_BATCH_SIZE):
+        texts = [msg.text for msg in data.messages[start:start + NLP_BATCH_SIZE]]
+        
+        # 2. Keyword Extraction (spaCy) and Sentiment Analysis (VADER)
+        # Lemmas and compound scores are computed per message so they can be
+        # served from the cache. A token is a keyword if it's not a stop word,
+        # not punctuation, and is an alphabetical character.
+        # Use the lowercase lemma (root form) of the word.
+        for text, entry in zip(texts, analyze_texts(texts, with_keywords=True, model=model, mode=mode)):
+            acc.add(text, entry)
+
+    # 3. Legacy sentiment re-scores the concatenated text
+    sentiment_score = None
+    if SENTIMENT_AGGREGATION == "legacy" and acc.has_text:
+        sentiment_score = sentiment_task(" ".join([msg.text for msg in data.messages]))
+
+    # 4. Top 5 keywords and summary (AI model if configured, else the first 200 chars)
+    return fast_response(acc.report(sentiment_score), response)
+
+# Create a POST endpoint at '/analyze_users' to rank users by participation
+@app.post("/analyze_users", response_model=UserRankingReport)
+@profiled
+def analyze_user_participation(data: AnalysisInput, mode: Optional[str] = None,
+                               request: Request = None, response: Response = None):
+    """
+    Analyze and rank users based on their participation in the chat.
+    Considers message count, word count, and sentiment to calculate participation score.
+    Identical inputs are served from RESPONSE_CACHE, with an ETag.
+    The ranking needs no parsing, so it is the same in every mode; the mode
+    only picks which ANALYSIS_CACHE entries are shared.
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    record_input('/analyze_users', len(data.messages))
+    
+    return cached_response('/analyze_users', data, model, request, response,
+                           lambda: compute_user_ranking(data.messages, model, mode))
+
+# Create a POST endpoint for weekly mentor report
+@app.post("/weekly_report", response_model=WeeklyMentorReport)
+@profiled
+def generate_weekly_mentor_report(data: AnalysisInput, mode: Optional[str] = None,
+                                  request: Request = None, response: Response = None):
+    """
+    Generate a comprehensive weekly report for mentors using trained AI models.
+    Analyzes who is actually working vs just chatting, identifies key discussions,
+    tracks task completion, and provides actionable insights.
+    Identical inputs are served from RESPONSE_CACHE, with an ETag.
+    The mode only changes how technical_topics are found.
+    """
+    mode = resolve_analysis_mode(mode)
+    # One model snapshot for the whole report, even if a retrain finishes meanwhile
+    model = current_model()
+    set_model_version_header(response, model)
+    record_input('/weekly_report', len(data.messages))
+    
+    # The report period is today's week, so the date is part of the key
+    return cached_response('/weekly_report', data, model, request, response,
+                           lambda: compute_weekly_report(data.messages, model, mode=mode),
+                           date.today().isoformat(), mode)
+
+# Create a POST endpoint for weekly reports of many projects at once
+@app.post("/weekly_report/batch", response_model=BatchReportResult)
+@profiled
+def generate_batch_weekly_reports(data: BatchReportInput, stream: bool = False, mode: Optional[str] = None,
+                                  response: Response = None):
+    """
+    Generate weekly mentor reports for many projects concurrently.
+    Projects are fanned out over the worker pool (ANALYSIS_WORKERS). With
+    stream=true the reports come back as newline-delimited JSON, one line
+    per project as soon as it finishes; otherwise they are returned
+    together in input order. A failing project gets an error entry
+    instead of failing the whole batch.
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    record_input('/weekly_report/batch', sum(len(p.messages) for p in data.projects))
+    
+    # Nothing to fan out: analyze inline and skip the pool overhead
+    if len(data.projects) <= 1 or ANALYSIS_WORKERS <= 1:
+        results = (project_report_task(p.project_id, p.messages, model, mode) for p in data.projects)
+        if stream:
+            return StreamingResponse(
+                (result.model_dump_json() + "\n" for result in results),
+                media_type="application/x-ndjson",
+                headers={'X-Model-Version': model.version or 'untrained'}
+            )
+        return fast_response(BatchReportResult(reports=list(results)), response)
+    
+    executor = get_executor()
+    futures = [
+        executor.submit(project_report_task, p.project_id, p.messages, model, mode)
+        for p in data.projects
+    ]
+    
+    if stream:
+        def stream_results():
+            for future in as_completed(futures):
+                yield future.result().model_dump_json() + "\n"
+        
+        return StreamingResponse(
+            stream_results(),
+            media_type="application/x-ndjson",
+            headers={'X-Model-Version': model.version or 'untrained'}
+        )
+    
+    return fast_response(BatchReportResult(reports=[future.result() for future in futures]), response)
+
+# Streaming variants: the request body is NDJSON, one ChatMessage per line
+@app.post("/analyze/stream", response_model=WeeklyReport)
+async def analyze_chat_stream(request: Request, response: Response, mode: Optional[str] = None):
+    """
+    /analyze over a newline-delimited JSON body, analyzed batch by batch as
+    it arrives. Sentiment is aggregated per SENTIMENT_AGGREGATION, with
+    "legacy" falling back to the mean since the text isn't kept.
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    
+    summarize = mode == 'deep'
+    acc = ChatSummaryAccumulator(
+        SUMMARIZER_INPUT_CHARS if SUMMARIZER_MODEL and summarize else SUMMARY_PREFIX_CHARS,
+        summarize=summarize
+    )
+    async for batch in iter_ndjson_batches(request):
+        texts = [msg.text for msg in batch]
+        entries = await run_in_threadpool(run_profiled, analyze_texts, texts, with_keywords=True,
+                                          model=model, mode=mode)
+        for text, entry in zip(texts, entries):
+            acc.add(text, entry)
+    
+    record_input('/analyze/stream', acc.total_messages)
+    return fast_response(acc.report(), response)
+
+@app.post("/analyze_users/stream", response_model=UserRankingReport)
+async def analyze_user_participation_stream(request: Request, response: Response, mode: Optional[str] = None):
+    """
+    /analyze_users over a newline-delimited JSON body. Each user's sentiment
+    combines their per-message scores ("legacy" falls back to the mean).
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    
+    acc = ParticipationAccumulator()
+    async for batch in iter_ndjson_batches(request):
+        entries = await run_in_threadpool(run_profiled, analyze_texts, [msg.text for msg in batch],
+                                          model=model, mode=mode)
+        for msg, entry in zip(batch, entries):
+            acc.add(msg.username, entry)
+    
+    record_input('/analyze_users/stream', acc.total_messages)
+    return fast_response(build_user_ranking(acc.user_stats(), acc.total_messages), response)
+
+@app.post("/weekly_report/stream", response_model=WeeklyMentorReport)
+async def generate_weekly_mentor_report_stream(request: Request, response: Response, mode: Optional[str] = None):
+    """
+    /weekly_report over a newline-delimited JSON body. Messages are folded
+    into a WeeklyAccumulator batch by batch, so memory is bounded by the
+    aggregates rather than the input. Overall sentiment combines the
+    per-message scores ("legacy" falls back to the mean).
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    
+    acc = WeeklyAccumulator()
+    async for batch in iter_ndjson_batches(request):
+        records = await run_in_threadpool(run_profiled, analyze_messages, batch, model=model, mode=mode)
+        with stage_timer('aggregation'):
+            acc.add_all(records)
+    
+    record_input('/weekly_report/stream', acc.total_messages)
+    report_period = f"Week of {datetime.now().strftime('%B %d, %Y')}"
+    with stage_timer('report'):
+        return fast_response(build_weekly_report(acc, model, acc.sentiment_score(), report_period), response)
+
+# Incremental ingest: analyze new messages once and fold them into weekly aggregates
+@app.post("/projects/{project_id}/messages", response_model=IngestResult)
+@profiled
+def ingest_project_messages(project_id: str, data: IngestInput, mode: Optional[str] = None,
+                            response: Response = None):
+    """
+    Add new messages to a project's rolling weekly aggregates.
+    Each message is analyzed once, when it is ingested (in the given mode),
+    and bucketed into the ISO week of its timestamp. Message IDs that were
+    already ingested are skipped and reported back as duplicates. Messages
+    without a timestamp have no week to go in and are rejected.
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    record_input('/projects/{project_id}/messages', len(data.messages))
+    
+    # Work out each message's week before touching any state
+    undated = [msg.message_id for msg in data.messages if not msg.timestamp]
+    if undated:
+        raise HTTPException(status_code=422, detail=f"Messages without a timestamp: {', '.join(undated)}")
+    try:
+        week_keys = [iso_week_key(parse_timestamp(msg.timestamp)) for msg in data.messages]
+    except (ValueError, OverflowError) as e:
+        # OverflowError: a timestamp that leaves the datetime range in UTC
+        raise HTTPException(status_code=422, detail=f"Invalid message timestamp: {e}")
+    
+    # Reserve the new message IDs so concurrent ingests can't both accept them
+    new_messages = []
+    duplicates = []
+    with INGEST_LOCK:
+        weeks = PROJECT_WEEKS[project_id]
+        for msg, week_key in zip(data.messages, week_keys):
+            if any(msg.message_id in state['message_ids'] for state in weeks.values()):
+                duplicates.append(msg.message_id)
+                continue
+            
+            state = weeks.setdefault(week_key, {'acc': WeeklyAccumulator(), 'message_ids': set()})
+            state['message_ids'].add(msg.message_id)
+            new_messages.append((msg, week_key))
+    
+    # Analyze only the new messages, outside the lock
+    try:
+        records = analyze_messages([msg for msg, _ in new_messages], model=model, mode=mode)
+    except Exception:
+        with INGEST_LOCK:
+            weeks = PROJECT_WEEKS[project_id]
+            for msg, week_key in new_messages:
+                state = weeks.get(week_key)
+                if state is not None:
+                    state['message_ids'].discard(msg.message_id)
+                    # Drop weeks this request created, so they don't serve empty reports
+                    if not state['message_ids'] and not state['acc'].total_messages:
+                        del weeks[week_key]
+            if not weeks:
+                del PROJECT_WEEKS[project_id]
+        raise
+    
+    with INGEST_LOCK:
+        weeks = PROJECT_WEEKS[project_id]
+        for (msg, week_key), record in zip(new_messages, records):
+            state = weeks.setdefault(week_key, {'acc': WeeklyAccumulator(), 'message_ids': {msg.message_id}})
+            state['acc'].add(record)
+        prune_project_weeks(weeks)
+    
+    return IngestResult(
+        project_id=project_id,
+        accepted=len(new_messages),
+        duplicates=duplicates,
+        weeks=sorted({week_key for _, week_key in new_messages})
+    )
+
+# Weekly report served from the ingested aggregates
+@app.get("/projects/{project_id}/weekly_report", response_model=WeeklyMentorReport)
+@profiled
+def get_project_weekly_report(project_id: str, week: Optional[str] = None, response: Response = None):
+    """
+    Build the weekly mentor report for an ingested project from its
+    aggregates, without re-analyzing any message. Defaults to the most
+    recent week with data; pass week=YYYY-Www for another one.
+    Overall sentiment combines the per-message scores ("legacy" falls back
+    to the mean).
+    """
+    model = current_model()
+    set_model_version_header(response, model)
+    
+    with INGEST_LOCK:
+        weeks = PROJECT_WEEKS.get(project_id)
+        if not weeks:
+            raise HTTPException(status_code=404, detail=f"No messages ingested for project {project_id}")
+        
+        week_key = week or max(weeks)
+        state = weeks.get(week_key)
+        if state is None:
+            raise HTTPException(status_code=404, detail=f"No messages ingested for project {project_id} in {week_key}")
+        
+        acc = state['acc']
+        with stage_timer('report'):
+            report = build_weekly_report(acc, model, acc.sentiment_score(), week_report_period(week_key))
+    return fast_response(report, response)
+
+# Activity over time: per-day/week buckets and trailing windows in one request
+@app.post("/activity_timeline", response_model=ActivityTimeline)
+@profiled
+def get_activity_timeline(data: TimelineInput, mode: Optional[str] = None, response: Response = None):
+    """
+    Bucket the messages by day or ISO week (by timestamp) and report
+    message counts, sentiment, tasks, blockers and participation per
+    bucket and for each trailing window, e.g. the last 7, 14 and 30 days,
+    so overlapping periods don't have to be analyzed separately.
+    The timeline needs no parsing, so it is the same in every mode.
+    """
+    mode = resolve_analysis_mode(mode)
+    model = current_model()
+    set_model_version_header(response, model)
+    
+    if data.bucket not in TIMELINE_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"bucket must be one of {', '.join(TIMELINE_BUCKETS)}")
+    if any(not 0 < days <= TIMELINE_MAX_WINDOW_DAYS for days in data.windows):
+        raise HTTPException(status_code=422, detail=f"windows must be between 1 and {TIMELINE_MAX_WINDOW_DAYS} days")
+    try:
+        end = (parse_timestamp(data.end) - EPOCH) // timedelta(microseconds=1)
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid end timestamp: {e}")
+    
+    record_input('/activity_timeline', len(data.messages))
+    batch = MessageBatch.from_messages(data.messages)
+    entries = analyze_texts(batch.texts(), model=model, mode=mode)
+    with stage_timer('aggregation'):
+        try:
+            timeline = build_activity_timeline(batch, entries, data.bucket, data.windows, end)
+        except OverflowError:
+            # A bucket or window reaching past year 1 or 9999
+            raise HTTPException(status_code=422, detail="Timestamps too close to the limits of the datetime range")
+    return fast_response(timeline, response)
+
+# Time from the start of the import until the module finished loading
+STARTUP_TIMINGS['import_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+
 # --- 8. Uvicorn run command ---
 # This block allows running the app directly with 'python main.py'
 # However, for development, 'uvicorn main:app --reload' is better.
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
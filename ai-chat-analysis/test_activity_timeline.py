@@ -0,0 +1,68 @@
+"""
+Test /activity_timeline buckets and windows, and that timestamps or windows
+outside the datetime range get a 422 (or count as undated) instead of a
+500. Uses the fast analysis mode, so no spaCy model is needed.
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+def message(timestamp, username: str = "alice", text: str = "Fixed the login bug, blocked on review"):
+    return {"username": username, "text": text, "timestamp": timestamp}
+
+def timeline(messages, **options):
+    return client.post("/activity_timeline?mode=fast", json=dict(messages=messages, **options))
+
+def test_buckets_and_windows():
+    """Day buckets and trailing windows count the dated messages"""
+    messages = [message("2025-03-01T10:00:00"), message("2025-03-01T18:00:00", "bob"),
+                message("2025-03-09T08:00:00"), message(None)]
+    response = timeline(messages, windows=[7, 30], end="2025-03-10T00:00:00Z")
+    assert response.status_code == 200
+    data = response.json()
+    assert [(b['start'][:10], b['message_count'], b['active_users']) for b in data['buckets']] == [
+        ("2025-03-01", 2, 2), ("2025-03-09", 1, 1)]
+    assert [(w['days'], w['message_count']) for w in data['windows']] == [(7, 1), (30, 3)]
+    assert data['undated_messages'] == 1
+
+def test_overflowing_message_timestamps_are_undated():
+    """Message timestamps that overflow in UTC are counted as undated"""
+    messages = [message("2025-03-01T10:00:00")] + [message(t) for t in OVERFLOW_TIMESTAMPS]
+    response = timeline(messages, end="2025-03-10T00:00:00Z")
+    assert response.status_code == 200
+    assert response.json()['undated_messages'] == 2
+    assert sum(b['message_count'] for b in response.json()['buckets']) == 1
+
+def test_overflowing_end_gets_422():
+    """An end timestamp that overflows in UTC is rejected"""
+    for end in OVERFLOW_TIMESTAMPS + ["not a date"]:
+        response = timeline([message("2025-03-01T10:00:00")], end=end)
+        assert response.status_code == 422, end
+        assert "end timestamp" in response.json()['detail']
+
+def test_window_limits():
+    """Windows must be positive and at most TIMELINE_MAX_WINDOW_DAYS"""
+    messages = [message("2025-03-01T10:00:00")]
+    for windows in ([0], [-7], [main.TIMELINE_MAX_WINDOW_DAYS + 1], [100000000]):
+        assert timeline(messages, windows=windows).status_code == 422, windows
+    response = timeline(messages, windows=[main.TIMELINE_MAX_WINDOW_DAYS], end="2025-03-10T00:00:00Z")
+    assert response.status_code == 200
+    assert response.json()['windows'][0]['message_count'] == 1
+
+def test_range_edges_get_422():
+    """A bucket or window reaching past year 9999 or before year 1 is rejected"""
+    assert timeline([message("9999-12-31T12:00:00")], end="2025-03-10T00:00:00Z").status_code == 422
+    assert timeline([message("2025-03-01T10:00:00")], end="0001-01-03T00:00:00").status_code == 422
+
+if __name__ == "__main__":
+    test_buckets_and_windows()
+    test_overflowing_message_timestamps_are_undated()
+    test_overflowing_end_gets_422()
+    test_window_limits()
+    test_range_edges_get_422()
+    print("✅ Activity timeline tests passed")
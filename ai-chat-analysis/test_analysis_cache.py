@@ -0,0 +1,33 @@
+"""
+Test the per-message analysis cache directly, without the HTTP server.
+Uses the fast analysis mode, so no spaCy model is needed.
+"""
+import main
+
+def test_eviction_within_one_call():
+    """A text repeated after its cache entry was evicted is still fully analyzed"""
+    texts = ["Fixed the login bug", "Deployed the new build", "Reviewed the schema", "Fixed the login bug"]
+    previous = main.ANALYSIS_CACHE
+    main.ANALYSIS_CACHE = main.AnalysisCache(2)
+    try:
+        entries = main.analyze_texts(texts, with_topics=True, with_keywords=True, mode='fast')
+    finally:
+        main.ANALYSIS_CACHE = previous
+    
+    for text, entry in zip(texts, entries):
+        assert entry['keywords'] is not None, f"keywords missing for {text!r}"
+        assert entry['noun_chunks'] is not None, f"noun chunks missing for {text!r}"
+    assert entries[0]['keywords'] == entries[3]['keywords']
+
+def test_repeated_text_shares_entry():
+    """Without eviction a repeated text is analyzed once and shares its entry"""
+    texts = ["Merged the pull request", "Merged the pull request"]
+    main.ANALYSIS_CACHE.clear()
+    entries = main.analyze_texts(texts, with_keywords=True, mode='fast')
+    assert entries[0] is entries[1]
+    assert entries[0]['keywords'] is not None
+
+if __name__ == "__main__":
+    test_eviction_within_one_call()
+    test_repeated_text_shares_entry()
+    print("✅ Analysis cache tests passed")
@@ -0,0 +1,108 @@
+"""
+Test the incremental ingest API: duplicate message IDs, rejected
+timestamps and rollback when analysis fails. Uses the fast analysis mode,
+so no spaCy model is needed.
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app, raise_server_exceptions=False)
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+def message(message_id: str, timestamp: str, text: str = "Fixed the login bug in the API"):
+    return {"message_id": message_id, "username": "alice", "text": text, "timestamp": timestamp}
+
+def ingest(project_id: str, messages):
+    return client.post(f"/projects/{project_id}/messages?mode=fast", json={"messages": messages})
+
+def week_ids(project_id: str):
+    return {week: set(state['message_ids']) for week, state in main.PROJECT_WEEKS.get(project_id, {}).items()}
+
+def test_duplicates_are_skipped():
+    """Re-sent message IDs are reported as duplicates and counted once"""
+    project_id = "test-ingest-duplicates"
+    try:
+        first = ingest(project_id, [message("m1", "2025-03-03T10:00:00"), message("m2", "2025-03-04T10:00:00")])
+        assert first.status_code == 200
+        assert first.json()['accepted'] == 2
+
+        second = ingest(project_id, [message("m2", "2025-03-04T10:00:00"), message("m3", "2025-03-05T10:00:00")])
+        assert second.status_code == 200
+        assert second.json()['accepted'] == 1
+        assert second.json()['duplicates'] == ["m2"]
+
+        report = client.get(f"/projects/{project_id}/weekly_report")
+        assert report.status_code == 200
+        assert report.json()['total_messages'] == 3
+    finally:
+        main.PROJECT_WEEKS.pop(project_id, None)
+
+def test_bad_timestamps_rejected_without_state():
+    """Undated, unparseable and overflowing timestamps get 422 and store nothing"""
+    project_id = "test-ingest-timestamps"
+    try:
+        for bad in [None, "not a date"] + OVERFLOW_TIMESTAMPS:
+            response = ingest(project_id, [message("m1", "2025-03-03T10:00:00"), message("m2", bad)])
+            assert response.status_code == 422, bad
+            assert project_id not in main.PROJECT_WEEKS or not main.PROJECT_WEEKS[project_id], bad
+
+        # Nothing was reserved, so the same IDs are accepted afterwards
+        response = ingest(project_id, [message("m1", "2025-03-03T10:00:00"), message("m2", "2025-03-04T10:00:00")])
+        assert response.json()['accepted'] == 2
+    finally:
+        main.PROJECT_WEEKS.pop(project_id, None)
+
+def test_failed_analysis_rolls_back():
+    """A batch whose analysis fails leaves earlier weeks as they were and adds none"""
+    project_id = "test-ingest-rollback"
+    try:
+        ingest(project_id, [message("m1", "2025-03-03T10:00:00")])
+        before = week_ids(project_id)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("analysis failed")
+
+        analyze_messages = main.analyze_messages
+        main.analyze_messages = fail
+        try:
+            # m2 joins the existing week, m3 would create a new one
+            response = ingest(project_id, [message("m2", "2025-03-04T10:00:00"), message("m3", "2025-04-15T10:00:00")])
+        finally:
+            main.analyze_messages = analyze_messages
+        assert response.status_code == 500
+        assert week_ids(project_id) == before
+
+        # The rolled back IDs were released, so they are not duplicates now
+        response = ingest(project_id, [message("m2", "2025-03-04T10:00:00"), message("m3", "2025-04-15T10:00:00")])
+        assert response.json()['accepted'] == 2
+        assert response.json()['duplicates'] == []
+    finally:
+        main.PROJECT_WEEKS.pop(project_id, None)
+
+def test_failed_first_batch_leaves_no_project():
+    """Rolling back a project's first batch removes the project entirely"""
+    project_id = "test-ingest-rollback-new"
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("analysis failed")
+
+    analyze_messages = main.analyze_messages
+    main.analyze_messages = fail
+    try:
+        response = ingest(project_id, [message("m1", "2025-03-03T10:00:00")])
+    finally:
+        main.analyze_messages = analyze_messages
+        leftover = main.PROJECT_WEEKS.pop(project_id, None)
+    assert response.status_code == 500
+    assert leftover is None
+    assert client.get(f"/projects/{project_id}/weekly_report").status_code == 404
+
+if __name__ == "__main__":
+    test_duplicates_are_skipped()
+    test_bad_timestamps_rejected_without_state()
+    test_failed_analysis_rolls_back()
+    test_failed_first_batch_leaves_no_project()
+    print("✅ Ingest tests passed")
@@ -0,0 +1,79 @@
+"""
+Test that the single-pass KeywordMatcher classifies messages exactly like
+the per-keyword substring scans it replaced. No spaCy model is needed.
+"""
+import main
+
+TRAINED_PATTERNS = {
+    'task_completion': ["finished the login page today", "merged the fix for the crash"],
+    'blockers': ["stuck on the docker build", "blocked by the failing migration"],
+    'progress_updates': ["working on the api docs", "pushed the first draft"],
+    'collaboration': ["thanks for the review", "lgtm, ship it"]
+}
+
+TEXTS = [
+    "",
+    "Hi everyone!",
+    "Fixed the login bug, pull request is up for review",
+    "I'll review the pull requests after lunch",
+    "Debugging the authentication/authorization flow in the backend",
+    "How do we configure the server? Setup is broken",
+    "Refactored   the MODULE; tests pass",
+    "stuck... the build fails with an ERROR in the migration",
+    "LGTM! Looks good, merging to the main branch",
+    "Café déployé — the frontend compiles now",
+    "i'll fix it, i've done the schema, ready for a re-run",
+    "what's the status of the endpoint?",
+    "unbuilt prefix-free reruns: codebase, classroom, testing",
+    # Keywords that start where a longer keyword starts (deploy/deployed, work/working on)
+    "Deployed the service and reviewed the PR",
+    "Completed the docs, working on merged branches next",
+]
+
+def substring_classification(text: str, trained_patterns):
+    """The classification as computed before KeywordMatcher, one `in` per keyword"""
+    text_lower = text.lower()
+    used_keywords = [kw for kw in main.TECHNICAL_KEYWORDS if kw in text_lower]
+    classification = {
+        'is_technical': bool(used_keywords),
+        'is_problem_solving': any(word in text_lower for word in main.PROBLEM_SOLVING_KEYWORDS),
+        'is_helping': any(phrase in text_lower for phrase in main.HELPING_PHRASES),
+        'is_question': text.strip().endswith('?') or any(text_lower.startswith(q) for q in main.QUESTION_WORDS),
+        'technical_keywords': used_keywords
+    }
+    for flag, pattern_type in (('task_completed', 'task_completion'), ('has_blocker', 'blockers'),
+                               ('progress_update', 'progress_updates'), ('collaboration', 'collaboration')):
+        classification[flag] = any(
+            any(word in text_lower for word in pattern.split()[:3])
+            for pattern in trained_patterns.get(pattern_type, [])
+        )
+    return classification
+
+def test_find_matches_substring_scan():
+    """find() returns exactly the keywords that occur as substrings"""
+    matcher = main.build_keyword_matcher(TRAINED_PATTERNS)
+    keywords = set(matcher.keyword_categories)
+    for text in TEXTS:
+        text_lower = text.lower()
+        assert matcher.find(text_lower) == {kw for kw in keywords if kw in text_lower}, text
+
+def test_classification_matches_substring_scan():
+    """Trained and untrained models classify like the old per-keyword scans"""
+    for patterns in (TRAINED_PATTERNS, {}):
+        model = main.build_model_snapshot(patterns, {}, source='test')
+        for text in TEXTS:
+            found = main.enhanced_message_classification(text, model=model)
+            assert found == substring_classification(text, patterns), text
+
+def test_tables_round_trip():
+    """A matcher rebuilt from its artifact tables finds the same keywords"""
+    matcher = main.build_keyword_matcher(TRAINED_PATTERNS)
+    rebuilt = main.KeywordMatcher.from_tables(matcher.to_tables())
+    for text in TEXTS:
+        assert rebuilt.find(text.lower()) == matcher.find(text.lower()), text
+
+if __name__ == "__main__":
+    test_find_matches_substring_scan()
+    test_classification_matches_substring_scan()
+    test_tables_round_trip()
+    print("✅ Keyword matcher tests passed")
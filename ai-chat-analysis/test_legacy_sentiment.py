@@ -0,0 +1,83 @@
+"""
+Test that SENTIMENT_AGGREGATION=legacy reproduces the original sentiment
+figures exactly: VADER over the concatenated text of the whole chat and of
+each user. Uses the fast analysis mode, so no spaCy model is needed.
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+MESSAGES = [
+    {"username": "alice", "text": "Fixed the login bug, great teamwork!", "timestamp": "2025-03-03T10:00:00"},
+    {"username": "bob", "text": "Still blocked on the docker build. This is awful.", "timestamp": OVERFLOW_TIMESTAMPS[0]},
+    {"username": "alice", "text": "Thanks Bob, I'll help with the migration :)", "timestamp": OVERFLOW_TIMESTAMPS[1]},
+    {"username": "carol", "text": "The tests fail again, I hate flaky CI", "timestamp": None},
+    {"username": "bob", "text": "ok", "timestamp": "2025-03-04T09:30:00"},
+]
+
+def original_ranking(messages):
+    """The /analyze_users rankings as computed before per-message scoring"""
+    sia = main.get_sia()
+    user_messages = {}
+    for msg in messages:
+        user_messages.setdefault(msg['username'], []).append(msg['text'])
+
+    stats = []
+    for username, texts in user_messages.items():
+        word_count = sum(len(text.split()) for text in texts)
+        avg_sentiment = sia.polarity_scores(" ".join(texts))['compound']
+        score = len(texts) * 10 + word_count * 0.5 + max(0, avg_sentiment * 20)
+        stats.append({"username": username, "message_count": len(texts), "word_count": word_count,
+                      "avg_sentiment": round(avg_sentiment, 3), "participation_score": round(score, 2)})
+    stats.sort(key=lambda s: s["participation_score"], reverse=True)
+    for rank, entry in enumerate(stats, start=1):
+        entry["rank"] = rank
+    return stats
+
+def post_legacy(path: str):
+    saved = main.SENTIMENT_AGGREGATION
+    main.SENTIMENT_AGGREGATION = "legacy"
+    try:
+        return client.post(f"{path}?mode=fast", json={"messages": MESSAGES})
+    finally:
+        main.SENTIMENT_AGGREGATION = saved
+
+def test_legacy_matches_original():
+    """Overall and per-user sentiment equal VADER over the concatenated texts"""
+    full_text = " ".join(msg['text'] for msg in MESSAGES)
+    expected = main.get_sia().polarity_scores(full_text)['compound']
+    main.RESPONSE_CACHE.clear()
+
+    analyze = post_legacy("/analyze")
+    assert analyze.status_code == 200
+    assert analyze.json()['overall_sentiment'] == expected
+
+    weekly = post_legacy("/weekly_report")
+    assert weekly.status_code == 200
+    assert weekly.json()['overall_sentiment'] == round(expected, 3)
+
+    ranking = post_legacy("/analyze_users")
+    assert ranking.status_code == 200
+    assert ranking.json()['user_rankings'] == original_ranking(MESSAGES)
+
+def test_mean_differs_from_legacy():
+    """The per-message mean is a different figure, so the setting matters"""
+    main.RESPONSE_CACHE.clear()
+    legacy = post_legacy("/weekly_report").json()['overall_sentiment']
+    saved = main.SENTIMENT_AGGREGATION
+    main.SENTIMENT_AGGREGATION = "mean"
+    try:
+        mean = client.post("/weekly_report?mode=fast", json={"messages": MESSAGES}).json()['overall_sentiment']
+    finally:
+        main.SENTIMENT_AGGREGATION = saved
+    assert legacy != mean
+
+if __name__ == "__main__":
+    test_legacy_matches_original()
+    test_mean_differs_from_legacy()
+    print("✅ Legacy sentiment tests passed")
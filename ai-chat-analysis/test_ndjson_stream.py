@@ -0,0 +1,71 @@
+"""
+Test the NDJSON streaming endpoints: blank lines are skipped, and a bad
+line gets a 422 naming its line number, also past the first batch and when
+the body arrives in chunks that split lines. Uses the fast analysis mode,
+so no spaCy model is needed.
+"""
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+ENDPOINTS = ["/analyze/stream", "/analyze_users/stream", "/weekly_report/stream"]
+
+def ndjson_lines(count: int):
+    return [
+        json.dumps({"username": f"user{i % 3}", "text": f"Fixed the login bug #{i}",
+                    "timestamp": OVERFLOW_TIMESTAMPS[i % 2] if i % 5 == 0 else "2025-03-03T10:00:00"})
+        for i in range(count)
+    ]
+
+def post(path: str, body):
+    return client.post(f"{path}?mode=fast", content=body)
+
+def test_valid_stream():
+    """Blank lines and CRLF endings are fine, overflowing timestamps too"""
+    body = "\r\n".join(ndjson_lines(20)[:10] + ["", "   "] + ndjson_lines(20)[10:]) + "\n\n"
+    for path in ENDPOINTS:
+        response = post(path, body)
+        assert response.status_code == 200, (path, response.text)
+    assert post("/weekly_report/stream", body).json()['total_messages'] == 20
+
+def test_invalid_json_line():
+    """A line that isn't JSON is reported with its line number"""
+    lines = ndjson_lines(4)
+    lines.insert(2, "{not json")
+    for path in ENDPOINTS:
+        response = post(path, "\n".join(lines))
+        assert response.status_code == 422, path
+        assert response.json()['detail'].startswith("Invalid message on line 3:"), response.json()
+
+def test_invalid_message_line():
+    """A JSON line that isn't a valid message is reported with its line number"""
+    lines = ndjson_lines(4) + ["", json.dumps({"username": "dave"})]
+    for path in ENDPOINTS:
+        response = post(path, "\n".join(lines))
+        assert response.status_code == 422, path
+        assert response.json()['detail'].startswith("Invalid message on line 6:"), response.json()
+
+def test_line_numbers_past_first_batch_and_chunks():
+    """Numbering carries across batches and across body chunks that split a line"""
+    count = main.NLP_BATCH_SIZE + 5
+    lines = ndjson_lines(count) + ['{"username": "eve", "text": 42}']
+    body = ("\n".join(lines) + "\n").encode('utf-8')
+    chunks = [body[start:start + 37] for start in range(0, len(body), 37)]
+    for path in ENDPOINTS:
+        response = post(path, iter(chunks))
+        assert response.status_code == 422, path
+        assert response.json()['detail'].startswith(f"Invalid message on line {count + 1}:"), response.json()
+
+if __name__ == "__main__":
+    test_valid_stream()
+    test_invalid_json_line()
+    test_invalid_message_line()
+    test_line_numbers_past_first_batch_and_chunks()
+    print("✅ NDJSON stream tests passed")
@@ -0,0 +1,71 @@
+"""
+Test the whole-response cache of /weekly_report and /analyze_users: ETags,
+304 for a matching If-None-Match and 412 for If-None-Match: *. Uses the
+fast analysis mode, so no spaCy model is needed.
+"""
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+MESSAGES = [
+    {"username": "alice", "text": "Fixed the login bug in the API module", "timestamp": "2025-03-03T10:00:00"},
+    {"username": "bob", "text": "Blocked on the docker build", "timestamp": OVERFLOW_TIMESTAMPS[0]},
+    {"username": "carol", "text": "Thanks for the review, merged it", "timestamp": OVERFLOW_TIMESTAMPS[1]},
+]
+
+ENDPOINTS = ["/weekly_report?mode=fast", "/analyze_users?mode=fast"]
+
+def post(path: str, messages=MESSAGES, if_none_match=None):
+    headers = {"If-None-Match": if_none_match} if if_none_match is not None else {}
+    return client.post(path, json={"messages": messages}, headers=headers)
+
+def test_etag_is_stable():
+    """Identical inputs get the same ETag and body, different inputs another ETag"""
+    main.RESPONSE_CACHE.clear()
+    for path in ENDPOINTS:
+        first = post(path)
+        second = post(path, messages=[dict(reversed(list(m.items()))) for m in MESSAGES])
+        other = post(path, messages=MESSAGES[:2])
+        assert first.status_code == second.status_code == other.status_code == 200, path
+        assert first.headers['ETag'] == second.headers['ETag'], path
+        assert first.json() == second.json(), path
+        assert other.headers['ETag'] != first.headers['ETag'], path
+
+def test_matching_etag_gets_304():
+    """A matching tag, weak or in a list, gets an empty 304 even after eviction"""
+    for path in ENDPOINTS:
+        etag = post(path).headers['ETag']
+        for header in [etag, f"W/{etag}", f'"other", {etag}']:
+            main.RESPONSE_CACHE.clear()
+            response = post(path, if_none_match=header)
+            assert response.status_code == 304, (path, header)
+            assert response.content == b""
+            assert response.headers['ETag'] == etag
+
+def test_other_etag_gets_200():
+    """A tag for another input is not a match"""
+    for path in ENDPOINTS:
+        etag = post(path, messages=MESSAGES[:2]).headers['ETag']
+        response = post(path, if_none_match=etag)
+        assert response.status_code == 200, path
+        assert response.headers['ETag'] != etag
+
+def test_star_gets_412():
+    """If-None-Match: * fails on these POST endpoints, alone or in a list"""
+    for path in ENDPOINTS:
+        for header in ["*", 'W/"other", *']:
+            response = post(path, if_none_match=header)
+            assert response.status_code == 412, (path, header)
+            assert response.content == b""
+
+if __name__ == "__main__":
+    test_etag_is_stable()
+    test_matching_etag_gets_304()
+    test_other_etag_gets_200()
+    test_star_gets_412()
+    print("✅ Response cache tests passed")
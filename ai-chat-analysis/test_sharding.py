@@ -0,0 +1,86 @@
+"""
+Test that analysis split into shards over the worker pool gives the same
+reports as a sequential pass. Uses a thread pool and the fast analysis
+mode, so no spaCy model or worker processes are needed.
+"""
+import main
+
+# Timestamps that parse but overflow when converted to UTC
+OVERFLOW_TIMESTAMPS = ["9999-12-31T23:59:59-05:00", "0001-01-01T00:00:00+05:00"]
+
+TEXTS = [
+    "Fixed the login bug in the API module",
+    "Blocked on the docker build, the migration keeps failing",
+    "Thanks for the review! Merged the pull request",
+    "Working on the frontend component for the dashboard",
+    "Hi everyone, great work this week!",
+    "Can someone check the database schema?",
+    "Deployed the new authentication service to staging",
+]
+
+def make_messages(count: int):
+    messages = []
+    for i in range(count):
+        timestamp = OVERFLOW_TIMESTAMPS[i % 2] if i % 11 == 0 else f"2025-03-{1 + i % 28:02d}T10:00:00"
+        messages.append(main.ChatMessage(username=f"user{i % 9}", text=f"{TEXTS[i % len(TEXTS)]} #{i % 40}",
+                                         timestamp=timestamp))
+    return messages
+
+class ShardedPool:
+    """Force sharding onto a small thread pool, restoring the settings on exit"""
+
+    def __init__(self, sharded: bool):
+        self.sharded = sharded
+
+    def __enter__(self):
+        self.saved = (main.ANALYSIS_WORKERS, main.SHARD_THRESHOLD, main.ANALYSIS_EXECUTOR, main._executor)
+        main.ANALYSIS_WORKERS = 3 if self.sharded else 1
+        main.SHARD_THRESHOLD = 50
+        main.ANALYSIS_EXECUTOR = "thread"
+        main._executor = None
+        main.ANALYSIS_CACHE.clear()
+        return self
+
+    def __exit__(self, *exc):
+        if main._executor is not None:
+            main._executor.shutdown()
+        main.ANALYSIS_WORKERS, main.SHARD_THRESHOLD, main.ANALYSIS_EXECUTOR, main._executor = self.saved
+        main.ANALYSIS_CACHE.clear()
+
+def run_all(messages):
+    model = main.current_model()
+    return (
+        main.compute_weekly_report(messages, model, mode='fast').model_dump(),
+        main.compute_user_ranking(messages, model, mode='fast').model_dump(),
+        [c.model_dump() for c in main.analyze_user_contributions(messages, model=model, mode='fast')]
+    )
+
+def test_sharded_matches_sequential():
+    """Weekly report, ranking and contributions don't depend on sharding"""
+    messages = make_messages(400)
+    with ShardedPool(sharded=False):
+        assert not main.should_shard(len(messages))
+        sequential = run_all(messages)
+    with ShardedPool(sharded=True):
+        assert main.should_shard(len(messages))
+        sharded = run_all(messages)
+    assert sharded == sequential
+
+def test_sharded_matches_sequential_legacy_sentiment():
+    """The legacy sentiment path shards by user and still matches"""
+    messages = make_messages(400)
+    saved = main.SENTIMENT_AGGREGATION
+    main.SENTIMENT_AGGREGATION = "legacy"
+    try:
+        with ShardedPool(sharded=False):
+            sequential = run_all(messages)
+        with ShardedPool(sharded=True):
+            sharded = run_all(messages)
+    finally:
+        main.SENTIMENT_AGGREGATION = saved
+    assert sharded == sequential
+
+if __name__ == "__main__":
+    test_sharded_matches_sequential()
+    test_sharded_matches_sequential_legacy_sentiment()
+    print("✅ Sharding tests passed")
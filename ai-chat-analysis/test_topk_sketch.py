@@ -0,0 +1,66 @@
+"""
+Test TopKSketch against collections.Counter: exact below capacity, and
+within error_bound() of the true counts once it has overflowed.
+"""
+import random
+from collections import Counter
+
+import main
+
+def zipf_items(count: int, distinct: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(words, weights=weights, k=count)
+
+def test_exact_below_capacity():
+    """Until it overflows the sketch is a Counter, ties in insertion order"""
+    items = zipf_items(5000, 50)
+    sketch = main.TopKSketch(capacity=64)
+    sketch.update(items)
+    counter = Counter(items)
+    assert not sketch.overflowed
+    assert sketch.error_bound() == 0
+    assert sketch.most_common(10) == counter.most_common(10)
+    assert sketch.most_common() == counter.most_common()
+
+def test_within_error_bound_after_overflow():
+    """Estimates overcount by at most error_bound(), and heavy hitters are kept"""
+    items = zipf_items(20000, 2000)
+    sketch = main.TopKSketch(capacity=100)
+    sketch.update(items)
+    counter = Counter(items)
+    bound = sketch.error_bound()
+
+    assert sketch.overflowed
+    assert bound <= len(items) / sketch.capacity
+    for item, estimate in sketch.most_common():
+        assert counter[item] <= estimate <= counter[item] + bound, item
+    for item, count in counter.items():
+        if count > bound:
+            assert item in sketch, item
+
+    # The top of the list is the true top when its gaps exceed the bound
+    top = [item for item, _ in counter.most_common(5)]
+    assert [item for item, _ in sketch.most_common(5)] == top
+
+def test_merge_matches_single_pass():
+    """Merging shard sketches keeps every estimate within the merged bound"""
+    items = zipf_items(20000, 2000, seed=11)
+    merged = main.TopKSketch(capacity=100)
+    for start in range(0, len(items), 5000):
+        shard = main.TopKSketch(capacity=100)
+        shard.update(items[start:start + 5000])
+        merged.merge(shard)
+    counter = Counter(items)
+    bound = merged.error_bound()
+
+    assert merged.total == len(items)
+    for item, estimate in merged.most_common():
+        assert counter[item] <= estimate <= counter[item] + bound, item
+
+if __name__ == "__main__":
+    test_exact_below_capacity()
+    test_within_error_bound_after_overflow()
+    test_merge_matches_single_pass()
+    print("✅ TopKSketch tests passed")
@@ -0,0 +1,29 @@
+"""
+train_model.py
+
+Trains the chat analysis patterns offline and writes the model artifact that
+main.py loads at startup, so the service doesn't have to train on every boot.
+Usage:
+  python train_model.py
+  python train_model.py --csv synthetic_chats.csv --out model_artifact.pkl
+
+Output:
+  model_artifact.pkl (or the path in MODEL_ARTIFACT_PATH / --out)
+"""
+import argparse
+
+import main
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train chat analysis patterns and save the model artifact')
+    parser.add_argument('--csv', type=str, default='synthetic_chats.csv', help='training CSV filename')
+    parser.add_argument('--out', type=str, default=main.MODEL_ARTIFACT_PATH, help='output artifact path')
+    args = parser.parse_args()
+
+    model = main.train_model_snapshot(args.csv)
+
+    if model is None:
+        raise SystemExit("Training produced no model; is the CSV file present?")
+
+    main.save_model_artifact(model, args.out)